@@ -0,0 +1,609 @@
+"""Filter-list matching engine used by the ad blocker.
+
+Rules are written in the Adblock Plus / EasyList syntax.  Every rule is
+indexed once when the list is loaded so that checking a request costs the
+same whether the list has ten rules or a hundred thousand:
+
+* ``||domain^`` rules go into a host-suffix hash table, looked up once per
+  label of the request host.
+* Every other rule is keyed by one of its literal tokens.  The request URL is
+  split into tokens by a single compiled regex and only the rules filed under
+  those tokens are verified.
+"""
+import hashlib
+import mmap
+import os
+import re
+import struct
+import zlib
+
+
+# Resource types understood by the ``$script``, ``$image``, ... options.
+RESOURCE_TYPES = frozenset({
+    'document', 'subdocument', 'stylesheet', 'script', 'image', 'font',
+    'media', 'object', 'xmlhttprequest', 'ping', 'websocket', 'other',
+})
+
+# Options that can be parsed but do not change network matching.
+IGNORED_OPTIONS = frozenset({'collapse', 'genericblock', 'generichide', 'elemhide'})
+
+# Built-in rules, used on top of any filter list found on disk.
+DEFAULT_FILTERS = [
+    '||doubleclick.net^',
+    '||googleadservices.com^',
+    '||ads.youtube.com^',
+    '||pagead2.googlesyndication.com^',
+    '||adnxs.com^',
+    '||trackcmp.net^',
+    '||adroll.com^',
+    '||googlesyndication.com^',
+    '||securepubads.g.doubleclick.net^',
+    '||ytads.youtube.com^',
+    '||static.wolf-327b.com^',
+    '||cdn.wolf-327b.com^',
+    '||acdn.tsyndicate.com^',
+    '||adservice.google.com^',
+    r'/\b(ad|track|analytics|advertisement|served)\b/',
+]
+
+FILTER_LIST_PATHS = ['filters.txt']
+COMPILED_FILTERS_PATH = 'filters.compiled'
+
+_URL_HOST_RE = re.compile(r'^[a-z][a-z0-9+.\-]*://(?:[^@/?#]*@)?(\[[^\]]*\]|[^:/?#]*)', re.IGNORECASE)
+_URL_TOKEN_RE = re.compile(r'[a-z0-9%]{3,}')
+_PATTERN_TOKEN_RE = re.compile(r'[^a-z0-9%*][a-z0-9%]{3,}(?=[^a-z0-9%*])')
+_OPTIONS_RE = re.compile(r'^[a-z0-9~_\-=,|.]+$', re.IGNORECASE)
+_DOMAIN_RULE_RE = re.compile(r"^\|\|([a-z0-9\-]+(?:\.[a-z0-9\-]+)*)\^$")
+_SEPARATOR_REGEX = r'(?:[\x00-\x24\x26-\x2C\x2F\x3A-\x40\x5B-\x5E\x60\x7B-\x7F]|$)'
+
+# Second-level labels under which registrations happen (example.co.uk).
+_SECOND_LEVEL_LABELS = frozenset({'co', 'com', 'net', 'org', 'gov', 'edu', 'ac', 'ne', 'or'})
+
+
+def url_host(url):
+    """Return the lower-cased host part of a URL string."""
+    match = _URL_HOST_RE.match(url)
+    return match.group(1).lower() if match else ''
+
+
+def base_domain(host):
+    """Approximate the registrable domain of a host (no public suffix list)."""
+    labels = host.split('.')
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def is_third_party(host, source_host):
+    """Whether a request to ``host`` made by a page on ``source_host`` is third-party."""
+    if not source_host:
+        return False
+    return base_domain(host) != base_domain(source_host)
+
+
+def host_suffixes(host):
+    """Yield ``a.b.c``, ``b.c`` and ``c`` for host ``a.b.c``."""
+    yield host
+    dot = host.find('.')
+    while dot >= 0:
+        yield host[dot + 1:]
+        dot = host.find('.', dot + 1)
+
+
+def pattern_to_regex(pattern):
+    """Translate an ABP URL pattern into a regular expression source."""
+    if len(pattern) > 2 and pattern.startswith('/') and pattern.endswith('/'):
+        return pattern[1:-1]
+
+    prefix = suffix = ''
+    if pattern.startswith('||'):
+        prefix = r'^[\w\-]+:/+(?:[^/]+\.)?'
+        pattern = pattern[2:]
+    elif pattern.startswith('|'):
+        prefix = '^'
+        pattern = pattern[1:]
+    if pattern.endswith('|'):
+        suffix = '$'
+        pattern = pattern[:-1]
+
+    parts = []
+    for char in pattern.strip('*'):
+        if char == '*':
+            if not parts or parts[-1] != '.*':
+                parts.append('.*')
+        elif char == '^':
+            parts.append(_SEPARATOR_REGEX)
+        else:
+            parts.append(re.escape(char))
+    return prefix + ''.join(parts) + suffix
+
+
+class Filter:
+    """A single parsed network filter rule."""
+
+    __slots__ = ('text', 'pattern', 'is_exception', 'domain', 'token', 'regex',
+                 'types', 'third_party', 'include_domains', 'exclude_domains', 'match_case')
+
+    def __init__(self, text, pattern, is_exception=False):
+        self.text = text
+        self.pattern = pattern
+        self.is_exception = is_exception
+        self.domain = None          # set for pure ``||domain^`` rules
+        self.token = ''
+        self.regex = None
+        self.types = None           # None means every type except 'document'
+        self.third_party = None     # None, True ($third-party) or False (~third-party)
+        self.include_domains = None
+        self.exclude_domains = None
+        self.match_case = False
+
+    def __repr__(self):
+        return f'Filter({self.text!r})'
+
+    def matches_options(self, resource_type, third_party, source_host):
+        """Check the ``$`` options against a request."""
+        if self.types is None:
+            if resource_type == 'document':
+                return False
+        elif resource_type not in self.types:
+            return False
+
+        if self.third_party is not None and self.third_party != third_party:
+            return False
+
+        if self.include_domains is not None or self.exclude_domains is not None:
+            suffixes = set(host_suffixes(source_host)) if source_host else set()
+            if self.exclude_domains and suffixes & self.exclude_domains:
+                return False
+            if self.include_domains and not suffixes & self.include_domains:
+                return False
+        return True
+
+    def matches_url(self, url, url_lower):
+        """Check the URL pattern; pure domain rules are matched by the index."""
+        if self.domain is not None:
+            return True
+        if self.regex is None:
+            flags = 0 if self.match_case else re.IGNORECASE
+            self.regex = re.compile(pattern_to_regex(self.pattern), flags)
+        return self.regex.search(url if self.match_case else url_lower) is not None
+
+
+def parse_filter(line):
+    """Parse one line of a filter list; return ``None`` for anything that is not a network rule."""
+    text = line.strip()
+    if not text or text.startswith(('!', '[')):
+        return None
+    if '##' in text or '#@#' in text or '#?#' in text or '#$#' in text:
+        return None  # element hiding rules are not network filters
+
+    is_exception = text.startswith('@@')
+    body = text[2:] if is_exception else text
+
+    options = []
+    dollar = body.rfind('$')
+    if dollar >= 0 and _OPTIONS_RE.match(body[dollar + 1:]):
+        options = body[dollar + 1:].split(',')
+        body = body[:dollar]
+
+    if not body:
+        body = '*'
+
+    rule = Filter(text, body, is_exception)
+    types = set()
+    excluded_types = set()
+    for option in options:
+        option = option.strip().lower()
+        negated = option.startswith('~')
+        name = option[1:] if negated else option
+
+        if name in RESOURCE_TYPES:
+            (excluded_types if negated else types).add(name)
+        elif name in ('third-party', '3p'):
+            rule.third_party = not negated
+        elif name in ('first-party', '1p'):
+            rule.third_party = negated
+        elif name == 'match-case':
+            rule.match_case = True
+        elif option.startswith('domain='):
+            include, exclude = set(), set()
+            for domain in option[len('domain='):].split('|'):
+                if domain.startswith('~'):
+                    exclude.add(domain[1:])
+                elif domain:
+                    include.add(domain)
+            rule.include_domains = include or None
+            rule.exclude_domains = exclude or None
+        elif name in IGNORED_OPTIONS:
+            continue
+        else:
+            return None  # unsupported option, e.g. $popup or $redirect
+
+    if types:
+        rule.types = frozenset(types)
+    elif excluded_types:
+        rule.types = frozenset(RESOURCE_TYPES - excluded_types - {'document'})
+
+    domain_match = _DOMAIN_RULE_RE.match(body.lower())
+    if domain_match and not rule.match_case:
+        rule.domain = domain_match.group(1)
+    return rule
+
+
+class FilterIndex:
+    """Indexes a set of rules by host suffix and by URL token."""
+
+    def __init__(self):
+        self.by_host = {}
+        self.by_token = {}
+        self.size = 0
+
+    def add(self, rule):
+        self.size += 1
+        if rule.domain is not None:
+            self.by_host.setdefault(rule.domain, []).append(rule)
+            return
+
+        rule.token = self._pick_token(rule.pattern)
+        self.by_token.setdefault(rule.token, []).append(rule)
+
+    def _pick_token(self, pattern):
+        """Choose the least used literal token of a pattern, as Adblock Plus does."""
+        if len(pattern) > 2 and pattern.startswith('/') and pattern.endswith('/'):
+            return ''
+        candidates = _PATTERN_TOKEN_RE.findall(pattern.lower())
+        best, best_count = '', None
+        for candidate in candidates:
+            token = candidate[1:]
+            count = len(self.by_token.get(token, ()))
+            if best_count is None or count < best_count:
+                best, best_count = token, count
+        return best
+
+    def host_rules(self, host):
+        return self.by_host.get(host)
+
+    def token_rules(self, token):
+        return self.by_token.get(token)
+
+    def match(self, url, url_lower, host, resource_type, third_party, source_host, tokens):
+        """Return the first matching rule for a request, or ``None``."""
+        for suffix in host_suffixes(host):
+            rules = self.host_rules(suffix)
+            if rules:
+                for rule in rules:
+                    if rule.matches_options(resource_type, third_party, source_host):
+                        return rule
+
+        for token in tokens:
+            rules = self.token_rules(token)
+            if rules:
+                for rule in rules:
+                    if (rule.matches_options(resource_type, third_party, source_host)
+                            and rule.matches_url(url, url_lower)):
+                        return rule
+        return None
+
+
+# Compiled filter file layout (all integers little-endian):
+#   header   magic, format version, sha256 of the sources, sha256 of their
+#            sizes and mtimes, rule counts and (offset, mask) of four hash
+#            tables: blocking hosts, blocking tokens, exception hosts,
+#            exception tokens
+#   tables   open-addressing slots of (crc32 of key, record offset), 0 = empty
+#   records  key length, key, rule count, offsets of the rule texts
+#   texts    rule text length and the UTF-8 rule text
+_COMPILED_MAGIC = b'SBFL'
+_COMPILED_VERSION = 2
+_HEADER = struct.Struct('<4sI32s32sII8I')
+_STAMP_OFFSET = struct.calcsize('<4sI32s')
+_SLOT = struct.Struct('<II')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_LOOKUP_CACHE_SIZE = 50000
+
+
+class CompiledFilterIndex(FilterIndex):
+    """A FilterIndex served from a memory-mapped compiled filter file.
+
+    Nothing is parsed up front: a bucket's rules are decoded the first time a
+    request looks them up and memoized from then on.
+    """
+
+    def __init__(self, buffer, host_table, token_table, size):
+        super().__init__()
+        self.buffer = buffer
+        self.host_table = host_table
+        self.token_table = token_table
+        self.size = size
+        self._buckets = {}
+        self._host_cache = {}
+        self._token_cache = {}
+
+    def add(self, rule):
+        raise TypeError('compiled filter indexes are read-only')
+
+    def host_rules(self, host):
+        return self._cached_lookup(self._host_cache, self.host_table, host)
+
+    def token_rules(self, token):
+        return self._cached_lookup(self._token_cache, self.token_table, token)
+
+    def _cached_lookup(self, cache, table, key):
+        # Hosts and URL tokens repeat heavily while browsing, so keep recent answers
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        if len(cache) >= _LOOKUP_CACHE_SIZE:
+            cache.clear()
+        rules = cache[key] = self._lookup(table, key)
+        return rules
+
+    def _lookup(self, table, key):
+        buffer = self.buffer
+        table_offset, mask = table
+        data = key.encode('utf-8')
+        key_hash = zlib.crc32(data)
+        slot = key_hash & mask
+        while True:
+            stored_hash, record = _SLOT.unpack_from(buffer, table_offset + slot * _SLOT.size)
+            if not record:
+                return None
+            if stored_hash == key_hash:
+                key_length, = _U16.unpack_from(buffer, record)
+                start = record + _U16.size
+                if buffer[start:start + key_length] == data:
+                    return self._bucket(start + key_length)
+            slot = (slot + 1) & mask
+
+    def _bucket(self, position):
+        rules = self._buckets.get(position)
+        if rules is None:
+            buffer = self.buffer
+            count, = _U32.unpack_from(buffer, position)
+            offsets = struct.unpack_from(f'<{count}I', buffer, position + _U32.size)
+            rules = []
+            for offset in offsets:
+                length, = _U32.unpack_from(buffer, offset)
+                text = buffer[offset + _U32.size:offset + _U32.size + length].decode('utf-8')
+                rules.append(parse_filter(text))
+            self._buckets[position] = rules
+        return rules
+
+
+class FilterEngine:
+    """Blocking and exception rules plus the logic that combines them."""
+
+    def __init__(self, lines=(), blocking=None, exceptions=None):
+        self.blocking = blocking if blocking is not None else FilterIndex()
+        self.exceptions = exceptions if exceptions is not None else FilterIndex()
+        self.add_filters(lines)
+
+    @classmethod
+    def from_files(cls, paths=None, include_defaults=True):
+        """Build an engine from the built-in rules and any filter lists that exist."""
+        lines, _ = read_filter_sources(paths, include_defaults)
+        return cls(lines)
+
+    @classmethod
+    def load_compiled(cls, path, sources=None):
+        """Map a compiled filter file; return ``None`` if it is missing, corrupt or stale.
+
+        ``sources`` (a ``FilterSources``) is checked by size and mtime first and
+        only read when those changed; ``None`` accepts any sources.  A file
+        whose sources were only touched gets the new stamp, so the next load
+        is back to a ``stat``.
+        """
+        try:
+            with open(path, 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(buffer) < _HEADER.size:
+            buffer.close()
+            return None
+        magic, version, digest, stamp, blocking_size, exceptions_size, *tables = _HEADER.unpack_from(buffer, 0)
+        if magic != _COMPILED_MAGIC or version != _COMPILED_VERSION or (
+                sources is not None and not sources.matches(stamp, digest)):
+            buffer.close()
+            return None
+        if sources is not None and stamp != sources.stamp:
+            try:
+                with open(path, 'r+b') as file:
+                    file.seek(_STAMP_OFFSET)
+                    file.write(sources.stamp)
+            except OSError as e:
+                print(f"Could not update compiled filters: {e}")
+
+        tables = list(zip(tables[::2], tables[1::2]))
+        return cls(
+            blocking=CompiledFilterIndex(buffer, tables[0], tables[1], blocking_size),
+            exceptions=CompiledFilterIndex(buffer, tables[2], tables[3], exceptions_size),
+        )
+
+    def write_compiled(self, path, source_hash, source_stamp=b'\0' * 32):
+        """Write the indexed rules to ``path`` in the memory-mappable format."""
+        indexes = [self.blocking.by_host, self.blocking.by_token,
+                   self.exceptions.by_host, self.exceptions.by_token]
+        layouts = []
+        position = _HEADER.size
+        for index in indexes:
+            slots = 1
+            while slots < len(index) * 2:
+                slots *= 2
+            layouts.append((position, slots - 1))
+            position += slots * _SLOT.size
+
+        blob = bytearray()
+        text_offsets = {}
+        for index in indexes:
+            for rules in index.values():
+                for rule in rules:
+                    if rule.text not in text_offsets:
+                        text_offsets[rule.text] = position + len(blob)
+                        data = rule.text.encode('utf-8')
+                        blob += _U32.pack(len(data)) + data
+
+        tables = bytearray()
+        for index, (_, mask) in zip(indexes, layouts):
+            slots = [(0, 0)] * (mask + 1)
+            for key, rules in index.items():
+                data = key.encode('utf-8')
+                key_hash = zlib.crc32(data)
+                slot = key_hash & mask
+                while slots[slot][1]:
+                    slot = (slot + 1) & mask
+                slots[slot] = (key_hash, position + len(blob))
+                blob += _U16.pack(len(data)) + data + _U32.pack(len(rules))
+                blob += struct.pack(f'<{len(rules)}I', *(text_offsets[rule.text] for rule in rules))
+            for slot in slots:
+                tables += _SLOT.pack(*slot)
+
+        header = _HEADER.pack(_COMPILED_MAGIC, _COMPILED_VERSION, source_hash, source_stamp,
+                              self.blocking.size, self.exceptions.size,
+                              *(value for layout in layouts for value in layout))
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(header)
+            file.write(tables)
+            file.write(blob)
+        os.replace(temp_path, path)
+
+    def __len__(self):
+        return self.blocking.size + self.exceptions.size
+
+    def add_filters(self, lines):
+        for line in lines:
+            rule = parse_filter(line)
+            if rule is None:
+                continue
+            if rule.is_exception:
+                self.exceptions.add(rule)
+            else:
+                self.blocking.add(rule)
+
+    def match(self, url, source_url='', resource_type='other'):
+        """Return the blocking rule that applies to a request, or ``None`` if it is allowed."""
+        url_lower = url.lower()
+        host = url_host(url_lower)
+        source_host = url_host(source_url) if source_url else ''
+        third_party = is_third_party(host, source_host)
+        tokens = _URL_TOKEN_RE.findall(url_lower)
+        tokens.append('')
+
+        rule = self.blocking.match(url, url_lower, host, resource_type, third_party, source_host, tokens)
+        if rule is None or not self.exceptions.size:
+            return rule
+
+        if self.exceptions.match(url, url_lower, host, resource_type, third_party, source_host, tokens):
+            return None
+        if source_url and self.is_allowlisted(source_url):
+            return None
+        return rule
+
+    def is_allowlisted(self, page_url):
+        """Whether a ``@@...$document`` rule disables blocking on a page."""
+        page_lower = page_url.lower()
+        host = url_host(page_lower)
+        tokens = _URL_TOKEN_RE.findall(page_lower)
+        tokens.append('')
+        return self.exceptions.match(page_url, page_lower, host, 'document', False, host, tokens) is not None
+
+
+def read_filter_sources(paths=None, include_defaults=True):
+    """Return the rule lines of the built-in rules and filter lists, and their sha256."""
+    digest = hashlib.sha256(b'%d\n' % _COMPILED_VERSION)
+    lines = list(DEFAULT_FILTERS) if include_defaults else []
+    for line in lines:
+        digest.update(line.encode('utf-8') + b'\n')
+    for path in FILTER_LIST_PATHS if paths is None else paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                data = file.read()
+            digest.update(data)
+            lines.extend(data.decode('utf-8', errors='replace').splitlines())
+    return lines, digest.digest()
+
+
+class FilterSources:
+    """The built-in rules and filter lists that compiled caches are made from.
+
+    ``stamp`` hashes the lists' sizes and mtimes and costs a ``stat`` per
+    list; the lines and their ``digest`` are only read when a cache's stamp
+    doesn't match, and then only once for every cache built from them.
+    """
+
+    def __init__(self, paths=None):
+        self.paths = list(FILTER_LIST_PATHS if paths is None else paths)
+        self._lines = None
+        self._digest = None
+        stamp = hashlib.sha256(b'%d\n' % _COMPILED_VERSION)
+        for line in DEFAULT_FILTERS:
+            stamp.update(line.encode('utf-8') + b'\n')
+        for path in self.paths:
+            try:
+                status = os.stat(path)
+                stamp.update(f'{path}\0{status.st_size}\0{status.st_mtime_ns}\n'.encode('utf-8'))
+            except OSError:
+                stamp.update(f'{path}\0-\n'.encode('utf-8'))
+        self.stamp = stamp.digest()
+
+    def _read(self):
+        if self._lines is None:
+            self._lines, self._digest = read_filter_sources(self.paths)
+
+    @property
+    def lines(self):
+        self._read()
+        return self._lines
+
+    @property
+    def digest(self):
+        self._read()
+        return self._digest
+
+    def matches(self, stamp, digest):
+        """Whether a cache with this stamp and digest was made from these sources."""
+        return stamp == self.stamp or digest == self.digest
+
+
+_filter_sources = {}
+
+
+def filter_sources(paths=None):
+    """Return the process-wide ``FilterSources`` for a set of lists, so they are read at most once."""
+    key = tuple(FILTER_LIST_PATHS if paths is None else paths)
+    sources = _filter_sources.get(key)
+    if sources is None:
+        sources = _filter_sources[key] = FilterSources(paths)
+    return sources
+
+
+def load_engine(paths=None, compiled_path=COMPILED_FILTERS_PATH):
+    """Load the filter engine from its compiled cache, rebuilding the cache if the sources changed."""
+    sources = filter_sources(paths)
+    engine = FilterEngine.load_compiled(compiled_path, sources)
+    if engine is not None:
+        return engine
+
+    engine = FilterEngine(sources.lines)
+    try:
+        engine.write_compiled(compiled_path, sources.digest, sources.stamp)
+    except OSError as e:
+        print(f"Could not write compiled filters: {e}")
+        return engine
+    return FilterEngine.load_compiled(compiled_path, sources) or engine
+
+
+_shared_engines = {}
+
+
+def shared_engine(paths=None, compiled_path=COMPILED_FILTERS_PATH):
+    """Return the process-wide engine for a set of filter lists, loading it on first use."""
+    key = (tuple(FILTER_LIST_PATHS if paths is None else paths), compiled_path)
+    engine = _shared_engines.get(key)
+    if engine is None:
+        engine = _shared_engines[key] = load_engine(paths, compiled_path)
+    return engine
@@ -0,0 +1,289 @@
+"""Headless batch rendering: snapshot a list of URLs without a browser window.
+
+    python browser.py batch links.txt [--format pdf] [--concurrency 4] [--timeout 30]
+    python batch.py urls.txt --format png --output-dir shots --log shots.jsonl
+
+URLs are read one per line (``-`` reads stdin; blank lines and ``#``
+comments are skipped) and rendered by a fixed pool of pages under the
+offscreen Qt platform.  Each page is reused for one URL after another and
+the list is only read as pages come free, so a list of any length runs in
+bounded memory.  Every page goes through the browser's ``AdBlocker``.
+
+For each URL the pool writes the page as HTML, PDF or PNG into the output
+directory and appends a line to the JSON-lines log: the URL, its status
+(``ok``, ``failed``, ``timeout`` or ``error``), load and save times, and the
+requests the page made and how many were blocked.  A URL that takes longer
+than the timeout to load and save is stopped and logged as ``timeout``.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QObject, QTimer, QUrl  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile  # noqa: E402
+from PyQt6.QtWebEngineWidgets import QWebEngineView  # noqa: E402
+
+from browser import AdBlocker, page_key  # noqa: E402
+from telemetry import PageStats  # noqa: E402
+
+
+FORMATS = ('html', 'pdf', 'png')
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT_SECONDS = 30
+VIEWPORT_SIZE = (1280, 800)
+PAINT_SETTLE_MS = 200   # let the offscreen view paint the loaded page before grabbing it
+MAX_NAME_LENGTH = 80
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch_output')
+
+# Slot states
+IDLE = 'idle'
+LOADING = 'loading'
+SAVING = 'saving'
+RESETTING = 'resetting'
+
+
+def read_urls(path):
+    """Yield the URLs of a list file lazily, adding ``https://`` where the scheme is missing."""
+    file = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for line in file:
+            url = line.strip()
+            if not url or url.startswith('#'):
+                continue
+            yield url if '://' in url else 'https://' + url
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def output_name(number, url, extension):
+    """File name for the ``number``-th URL: the number keeps it unique, the URL keeps it readable."""
+    qurl = QUrl(url)
+    slug = re.sub(r'[^A-Za-z0-9.-]+', '_', qurl.host() + qurl.path()).strip('_')
+    return f'{number:06d}-{slug[:MAX_NAME_LENGTH] or "page"}.{extension}'
+
+
+class BatchPage(QWebEnginePage):
+    """A page that never waits on a user: dialogs are dismissed and console output dropped."""
+
+    def javaScriptAlert(self, url, message):
+        pass
+
+    def javaScriptConfirm(self, url, message):
+        return False
+
+    def javaScriptPrompt(self, url, message, default):
+        return False, ''
+
+    def javaScriptConsoleMessage(self, level, message, line, source):
+        pass
+
+
+class RenderSlot:
+    """One reusable page of the pool and the URL it is working on."""
+
+    def __init__(self, pool, profile):
+        self.pool = pool
+        self.page = BatchPage(profile)
+        self.view = None
+        if pool.format == 'png':
+            # Only a view paints; it stays offscreen
+            self.view = QWebEngineView()
+            self.view.setPage(self.page)
+            self.view.resize(*VIEWPORT_SIZE)
+            self.view.show()
+        self.page.loadFinished.connect(self.on_load_finished)
+        self.page.pdfPrintingFinished.connect(self.on_pdf_finished)
+        self.page.urlChanged.connect(self.track_requests)
+        self.timer = QTimer(pool)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.on_timeout)
+        self.state = IDLE
+        self.job = None
+        self.requests = PageStats()  # the current job's requests, whatever URL it redirects to
+        self.tracked_url = None
+
+    def start(self, number, url):
+        self.job = {'number': number, 'url': url, 'started': time.perf_counter()}
+        self.state = LOADING
+        self.requests = PageStats()
+        self.track_requests(QUrl(url))
+        self.timer.start(self.pool.timeout_ms)
+        self.page.setUrl(QUrl(url))
+
+    def track_requests(self, qurl):
+        if self.job is None:
+            return  # about:blank between jobs
+        key = page_key(qurl)
+        if key != self.tracked_url:
+            self.pool.interceptor.stats.track_page(key, self.requests, self.tracked_url)
+            self.tracked_url = key
+
+    def on_load_finished(self, ok):
+        blank = self.page.url().toString() in ('', 'about:blank')
+        if self.state == RESETTING and blank:
+            self.state = IDLE
+            self.pool.slot_free(self)
+        elif self.state == LOADING and not blank:  # a stopped load's late signal is ignored
+            self.job['loaded'] = time.perf_counter()
+            if not ok:
+                self.finish('failed')
+                return
+            self.state = SAVING
+            self.save()
+
+    def save(self):
+        path = os.path.join(self.pool.output_dir,
+                            output_name(self.job['number'], self.job['url'], self.pool.format))
+        self.job['path'] = path
+        if self.pool.format == 'pdf':
+            self.page.printToPdf(path)
+        elif self.pool.format == 'png':
+            QTimer.singleShot(PAINT_SETTLE_MS, self.grab)
+        else:
+            self.page.toHtml(self.on_html)
+
+    def on_html(self, html):
+        if self.state != SAVING:
+            return
+        try:
+            with open(self.job['path'], 'w', encoding='utf-8') as file:
+                file.write(html)
+        except OSError as e:
+            self.finish('error', str(e))
+            return
+        self.finish('ok')
+
+    def on_pdf_finished(self, path, ok):
+        if self.state == SAVING and path == self.job['path']:
+            self.finish('ok' if ok else 'error')
+
+    def grab(self):
+        if self.state != SAVING:
+            return
+        ok = self.view.grab().save(self.job['path'], 'PNG')
+        self.finish('ok' if ok else 'error')
+
+    def on_timeout(self):
+        if self.state in (LOADING, SAVING):
+            self.page.triggerAction(QWebEnginePage.WebAction.Stop)
+            self.finish('timeout')
+
+    def finish(self, status, error=''):
+        """Log the job, then clear the page with about:blank before it takes the next URL."""
+        self.timer.stop()
+        self.pool.record(self.job, status, self.page, self.requests, error)
+        if self.tracked_url is not None:
+            self.pool.interceptor.stats.untrack_page(self.tracked_url, self.requests)
+            self.tracked_url = None
+        self.job = None
+        self.state = RESETTING
+        self.page.setUrl(QUrl('about:blank'))
+
+
+class RenderPool(QObject):
+    """Feeds URLs to a fixed number of pages, one at a time each, until the list runs out."""
+
+    def __init__(self, urls, output_dir, format='html', concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT_SECONDS, log_path=None, parent=None):
+        super().__init__(parent)
+        self.urls = iter(urls)
+        self.output_dir = output_dir
+        self.format = format
+        self.timeout_ms = int(timeout * 1000)
+        os.makedirs(output_dir, exist_ok=True)
+        self.log = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self.counts = {'ok': 0, 'failed': 0, 'timeout': 0, 'error': 0}
+        self.next_number = 0
+        self.started = None
+        self.exhausted = False
+
+        # Off the record so a crawl leaves the browser's cookies and cache alone, but
+        # with the same interceptor class, filter engine and block accounting
+        self.profile = QWebEngineProfile(self)
+        self.interceptor = AdBlocker(parent=self.profile)
+        self.profile.setUrlRequestInterceptor(self.interceptor)
+        self.slots = [RenderSlot(self, self.profile) for _ in range(max(1, concurrency))]
+
+    def start(self):
+        self.started = time.perf_counter()
+        for slot in self.slots:
+            if self.exhausted:
+                break  # a short list leaves the rest of the pages idle
+            self.slot_free(slot)
+
+    def slot_free(self, slot):
+        """Give a free page the next URL, or quit once every page is idle and none are left."""
+        if not self.exhausted:
+            url = next(self.urls, None)
+            if url is not None:
+                self.next_number += 1
+                slot.start(self.next_number, url)
+                return
+            self.exhausted = True
+        if all(other.state == IDLE for other in self.slots):
+            self.done()
+
+    def record(self, job, status, page, requests, error=''):
+        now = time.perf_counter()
+        loaded = job.get('loaded')
+        entry = {
+            'url': job['url'],
+            'final_url': page.url().toString(),
+            'status': status,
+            'load_ms': round((loaded - job['started']) * 1000, 1) if loaded else None,
+            'save_ms': round((now - loaded) * 1000, 1) if loaded and status == 'ok' else None,
+            'total_ms': round((now - job['started']) * 1000, 1),
+            'requests': requests.requests,
+            'blocked': requests.blocked,
+            'output': job.get('path') if status == 'ok' else None,
+        }
+        if error:
+            entry['error'] = error
+        self.counts[status] += 1
+        if self.log is not None:
+            self.log.write(json.dumps(entry) + '\n')
+            self.log.flush()
+        print(f"[{job['number']}] {status:<7} {entry['total_ms']:>9.0f} ms  {job['url']}")
+
+    def done(self):
+        elapsed = time.perf_counter() - self.started
+        total = sum(self.counts.values())
+        summary = ', '.join(f'{count} {status}' for status, count in self.counts.items() if count)
+        rate = f', {total / elapsed:.2f} pages/s' if elapsed > 0 else ''
+        print(f"Rendered {total} URLs in {elapsed:.1f} s{rate} ({summary or 'nothing to do'})")
+        if self.log is not None:
+            self.log.close()
+        self.interceptor.stats.flush()
+        QApplication.instance().quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='browser.py batch', description=__doc__.splitlines()[0])
+    parser.add_argument('urls', nargs='?', default='links.txt', help='URL list, one per line (- for stdin)')
+    parser.add_argument('--format', choices=FORMATS, default='html')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='pages rendering at once')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS, help='seconds per URL')
+    parser.add_argument('--log', default=None, help='JSON-lines timing log (default: <output-dir>/batch.jsonl)')
+    args = parser.parse_args(argv)
+
+    if args.urls != '-' and not os.path.exists(args.urls):
+        parser.error(f'no such URL list: {args.urls}')
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    pool = RenderPool(read_urls(args.urls), args.output_dir, args.format, args.concurrency, args.timeout,
+                      args.log or os.path.join(args.output_dir, 'batch.jsonl'))
+    QTimer.singleShot(0, pool.start)
+    app.exec()
+    return 0 if not pool.counts['failed'] + pool.counts['timeout'] + pool.counts['error'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""End-to-end benchmark of the browser under the offscreen Qt platform.
+
+Serves synthetic pages with hundreds of subresources (a share of them
+ad-like, on a second host so they count as third-party) from a local HTTP
+server and drives a real ``MainWindow`` against it.  It measures:
+
+* tab-open latency: the synchronous cost of ``add_new_tab``
+* ``AdBlocker.interceptRequest`` cost per request, over the fixture's URLs
+* time from opening a tab to its ``loadFinished``
+* history write cost on the GUI thread, and the time to flush it to disk
+* peak RSS of the browser and renderer processes with N tabs open
+
+Results are printed and written as JSON so runs can be compared:
+
+    python benchmarks/bench_browser.py [--tabs 20] [--output bench_browser.json]
+    python benchmarks/bench_browser.py --compare bench_browser.json
+
+Everything runs in a temporary directory, with the files the browser reads
+(links, filter lists, icons) copied in and the profile's storage and cache
+pointed there, so the history, session, cookies and cache of the real
+profile are not touched.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Read from the working directory by the browser; the compiled filters keep their mtime so they stay valid
+WORK_FILES = ('links.txt', 'filters.txt', 'filters.compiled', 'cosmetic.compiled', 'icon.png', 'loading.gif')
+WORK_DIRS = ('img',)
+
+CALLER_DIR = os.getcwd()  # --output and --compare are relative to where the script was started
+WORK_DIR = tempfile.mkdtemp(prefix='sbrows-bench-')
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+for name in WORK_FILES:
+    if os.path.exists(os.path.join(ROOT, name)):
+        shutil.copy2(os.path.join(ROOT, name), WORK_DIR)
+for name in WORK_DIRS:
+    if os.path.isdir(os.path.join(ROOT, name)):
+        shutil.copytree(os.path.join(ROOT, name), os.path.join(WORK_DIR, name))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('SBROWS_PROFILE_DIR', os.path.join(WORK_DIR, 'profile'))
+os.environ.setdefault('SBROWS_CACHE_DIR', os.path.join(WORK_DIR, 'cache'))
+os.chdir(WORK_DIR)
+
+from PyQt6.QtCore import QEventLoop, QTimer, QUrl, PYQT_VERSION_STR, QT_VERSION_STR  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+from PyQt6.QtWebEngineCore import QWebEngineUrlRequestInfo  # noqa: E402
+
+import browser  # noqa: E402
+from telemetry import process_rss  # noqa: E402
+
+
+LOAD_TIMEOUT_MS = 30 * 1000
+GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+       b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+AD_PATHS = ('/ad/banner{0}.gif', '/track/pixel{0}.gif', '/analytics/collect{0}.js', '/served/slot{0}.js')
+_Type = QWebEngineUrlRequestInfo.ResourceType
+
+
+def fixture_resources(page, count, first_party, third_party):
+    """(url, resource type) of the subresources of a synthetic page; about a third are ad-like."""
+    resources = []
+    for i in range(count):
+        n = page * count + i
+        kind = i % 10
+        if kind < 4:
+            resources.append((f'{first_party}/static/img{n}.gif', _Type.ResourceTypeImage))
+        elif kind < 6:
+            resources.append((f'{first_party}/static/app{n}.js', _Type.ResourceTypeScript))
+        elif kind < 7:
+            resources.append((f'{first_party}/static/style{n}.css', _Type.ResourceTypeStylesheet))
+        else:
+            path = AD_PATHS[n % len(AD_PATHS)].format(n)
+            kind = _Type.ResourceTypeScript if path.endswith('.js') else _Type.ResourceTypeImage
+            resources.append((third_party + path, kind))
+    return resources
+
+
+def fixture_page(page, count, first_party, third_party):
+    tags = []
+    for url, kind in fixture_resources(page, count, first_party, third_party):
+        if kind == _Type.ResourceTypeScript:
+            tags.append(f'<script src="{url}"></script>')
+        elif kind == _Type.ResourceTypeStylesheet:
+            tags.append(f'<link rel="stylesheet" href="{url}">')
+        else:
+            tags.append(f'<img src="{url}" width="1" height="1">')
+    return (f'<!doctype html><html><head><title>Fixture {page}</title></head><body>'
+            f'<h1>Fixture page {page}</h1>{"".join(tags)}</body></html>').encode()
+
+
+class FixtureServer:
+    """Local HTTP server for the fixture pages, on localhost with 127.0.0.1 as the third-party host."""
+
+    def __init__(self, subresources):
+        self.subresources = subresources
+        fixtures = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path.startswith('/page/'):
+                    body = fixture_page(int(path.rsplit('/', 1)[1]), fixtures.subresources,
+                                        fixtures.first_party, fixtures.third_party)
+                    content_type = 'text/html'
+                elif path.endswith('.js'):
+                    body, content_type = b'void 0;', 'application/javascript'
+                elif path.endswith('.css'):
+                    body, content_type = b'body{}', 'text/css'
+                elif path.endswith('.gif'):
+                    body, content_type = GIF, 'image/gif'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        port = self.server.server_address[1]
+        self.first_party = f'http://localhost:{port}'
+        self.third_party = f'http://127.0.0.1:{port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def page_url(self, page):
+        return f'{self.first_party}/page/{page}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RequestInfo:
+    """Stand-in for QWebEngineUrlRequestInfo, which can't be constructed from Python."""
+
+    __slots__ = ('url', 'first_party', 'type', 'blocked')
+
+    def __init__(self, url, first_party, resource_type):
+        self.url = QUrl(url)
+        self.first_party = QUrl(first_party)
+        self.type = resource_type
+        self.blocked = False
+
+    def requestUrl(self):
+        return self.url
+
+    def firstPartyUrl(self):
+        return self.first_party
+
+    def resourceType(self):
+        return self.type
+
+    def block(self, value):
+        self.blocked = value
+
+
+def summary(samples, scale=1.0):
+    """Median, 95th percentile and maximum of a list of timings, scaled (e.g. to ms)."""
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'median': statistics.median(ordered) * scale,
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * scale,
+        'max': ordered[-1] * scale,
+    }
+
+
+def wait_for(signal, timeout_ms=LOAD_TIMEOUT_MS):
+    """Run the event loop until ``signal`` fires; returns its arguments, or None on timeout."""
+    loop = QEventLoop()
+    received = []
+
+    def on_signal(*args):
+        received.append(args)
+        loop.quit()
+
+    signal.connect(on_signal)
+    QTimer.singleShot(timeout_ms, loop.quit)
+    loop.exec()
+    signal.disconnect(on_signal)
+    return received[0] if received else None
+
+
+def memory_usage(window):
+    return window.tab_lifecycle.memory_usage()
+
+
+def bench_tabs(window, fixtures, tabs):
+    """Open ``tabs`` fixture pages one after another, timing the open and the load."""
+    open_times, load_times, failed = [], [], 0
+    peak_rss = memory_usage(window)
+    for page in range(tabs):
+        started = time.perf_counter()
+        tab = window.add_new_tab(QUrl(fixtures.page_url(page)), f"Fixture {page}")
+        open_times.append(time.perf_counter() - started)
+
+        result = wait_for(tab.browser.loadFinished)
+        if result is None or not result[0]:
+            failed += 1
+        else:
+            load_times.append(time.perf_counter() - started)
+        peak_rss = max(peak_rss, memory_usage(window))
+    return {
+        'tab_open_ms': summary(open_times, 1e3),
+        'load_finished_ms': summary(load_times, 1e3) if load_times else None,
+        'failed_loads': failed,
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+        'tabs': tabs,
+    }
+
+
+def bench_interception(window, fixtures, pages, subresources):
+    """Per-request cost of the profile's interceptor over the fixture pages' subresources."""
+    interceptor = window.profile.interceptor
+    requests = []
+    for page in range(pages):
+        page_url = fixtures.page_url(page)
+        requests.extend(RequestInfo(url, page_url, kind)
+                        for url, kind in fixture_resources(page, subresources, fixtures.first_party,
+                                                           fixtures.third_party))
+    for info in requests[:200]:  # warm up lazily compiled patterns
+        interceptor.interceptRequest(RequestInfo(info.url.toString(), info.first_party.toString(), info.type))
+
+    started = time.perf_counter()
+    for info in requests:
+        interceptor.interceptRequest(info)
+    elapsed = time.perf_counter() - started
+    blocked = sum(info.blocked for info in requests)
+    return {'requests': len(requests), 'per_request_us': elapsed / len(requests) * 1e6, 'blocked': blocked}
+
+
+def bench_history(window, visits):
+    """GUI-thread cost of recording visits, and the time for the writer to commit them."""
+    samples = []
+    for i in range(visits):
+        url = QUrl(f'https://site{i % 500}.example.com/article/{i}')
+        started = time.perf_counter()
+        window.update_history(url, f'Article {i}')
+        samples.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    window.history.flush()
+    return {'update_history_us': summary(samples, 1e6), 'flush_ms': (time.perf_counter() - started) * 1e3,
+            'visits': visits}
+
+
+def run(args):
+    app = QApplication.instance() or QApplication(sys.argv)
+    fixtures = FixtureServer(args.subresources)
+    try:
+        started = time.perf_counter()
+        window = browser.MainWindow()
+        window_ms = (time.perf_counter() - started) * 1e3
+        window.current_browser().setUrl(QUrl('about:blank'))  # keep the start page off the network
+
+        results = {
+            'window_open_ms': window_ms,
+            'tabs': bench_tabs(window, fixtures, args.tabs),
+            'interception': bench_interception(window, fixtures, args.tabs, args.subresources),
+            'history': bench_history(window, args.visits),
+            'rss_mb_after': memory_usage(window) / (1024 * 1024),
+            'browser_rss_mb': process_rss(os.getpid()) / (1024 * 1024),
+        }
+        window.close()
+    finally:
+        fixtures.close()
+    app.processEvents()
+
+    return {
+        'time': time.time(),
+        'python': platform.python_version(),
+        'qt': QT_VERSION_STR,
+        'pyqt': PYQT_VERSION_STR,
+        'platform': platform.platform(),
+        'options': {'tabs': args.tabs, 'subresources': args.subresources, 'visits': args.visits},
+        'results': results,
+    }
+
+
+def flatten(results, prefix=''):
+    """Numeric leaves of a results dict as ``{'tabs.tab_open_ms.median': value}``."""
+    values = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            values.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def report(run_result, baseline=None):
+    current = flatten(run_result['results'])
+    previous = flatten(baseline['results']) if baseline else {}
+    for name, value in current.items():
+        line = f'{name:<40} {value:>12.2f}'
+        if name in previous and previous[name]:
+            line += f' {(value - previous[name]) / previous[name] * 100:>+8.1f}%'
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tabs', type=int, default=20)
+    parser.add_argument('--subresources', type=int, default=300)
+    parser.add_argument('--visits', type=int, default=2000)
+    parser.add_argument('--output', default=os.path.join(ROOT, 'bench_browser.json'))
+    parser.add_argument('--compare', help='earlier results file to print changes against')
+    args = parser.parse_args()
+    args.output = os.path.join(CALLER_DIR, args.output)
+    if args.compare:
+        args.compare = os.path.join(CALLER_DIR, args.compare)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    result = run(args)
+    report(result, baseline)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2)
+    print(f'Results written to {args.output}')
@@ -0,0 +1,88 @@
+"""Microbenchmark for the ad blocker's filter matching.
+
+Builds synthetic EasyList-style rule sets of growing size, compiles them to
+the memory-mapped format and measures the time to map the compiled file and
+the average cost of ``FilterEngine.match`` over a fixed mix of request URLs.
+Both should stay flat as the rule count grows.
+
+    python benchmarks/bench_filters.py [--sizes 1000,10000,50000,100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adblock import FilterEngine  # noqa: E402
+
+
+WORDS = ['banner', 'promo', 'pixel', 'beacon', 'sponsor', 'popunder', 'widget',
+         'metrics', 'stats', 'click', 'affiliate', 'tag', 'count', 'impression']
+
+
+def synthetic_rules(count, seed=1):
+    """Generate ``count`` rules with roughly EasyList's mix of rule kinds."""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        kind = rng.random()
+        word = rng.choice(WORDS)
+        if kind < 0.6:
+            rules.append(f'||{word}{i}.example{i % 97}.com^')
+        elif kind < 0.75:
+            rules.append(f'||{word}{i}.net^$third-party')
+        elif kind < 0.9:
+            rules.append(f'/{word}{i}/*.js$script')
+        elif kind < 0.97:
+            rules.append(f'-{word}-{i}.gif$image')
+        else:
+            rules.append(f'@@||{word}{i}.org^$script')
+    return rules
+
+
+def request_urls(count, seed=2):
+    rng = random.Random(seed)
+    urls = []
+    for i in range(count):
+        word = rng.choice(WORDS)
+        host = rng.choice(['cdn.news.com', f'{word}{i}.example{i % 97}.com', 'static.shop.co.uk', 'img.site.org'])
+        path = '/'.join(rng.choice(WORDS + ['assets', 'v2', 'app']) for _ in range(rng.randint(1, 5)))
+        urls.append((f'https://{host}/{path}/{word}-{i}.js?id={rng.randint(0, 10 ** 6)}', 'https://news.com/article'))
+    return urls
+
+
+def run(sizes, requests):
+    urls = request_urls(requests)
+    compiled_path = os.path.join(tempfile.mkdtemp(), 'filters.compiled')
+    print(f'{"rules":>8} {"build (s)":>10} {"mmap load (ms)":>15} {"per request (us)":>17} {"blocked":>8}')
+    for size in sizes:
+        started = time.perf_counter()
+        built = FilterEngine(synthetic_rules(size))
+        build = time.perf_counter() - started
+
+        built.write_compiled(compiled_path, b'\0' * 32)
+        started = time.perf_counter()
+        engine = FilterEngine.load_compiled(compiled_path)
+        load = (time.perf_counter() - started) * 1e3
+
+        for url, source in urls[:100]:  # warm up lazily compiled patterns
+            engine.match(url, source, 'script')
+
+        blocked = 0
+        started = time.perf_counter()
+        for url, source in urls:
+            if engine.match(url, source, 'script') is not None:
+                blocked += 1
+        per_request = (time.perf_counter() - started) / len(urls) * 1e6
+        print(f'{size:>8} {build:>10.2f} {load:>15.2f} {per_request:>17.1f} {blocked:>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,10000,50000,100000')
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(',')], args.requests)
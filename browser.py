@@ -2,67 +2,651 @@ import sys
 import os
 import re
 import json
-from PyQt6.QtCore import QUrl, Qt
+import sqlite3
+import time
+
+# Start of the startup timeline, taken before the Qt imports
+PROCESS_STARTED = time.perf_counter()
+
+from collections import Counter
+from datetime import datetime, timedelta
+from PyQt6.QtCore import QUrl, Qt, QTimer, QEvent, QCoreApplication, QAbstractListModel, QModelIndex, QObject, pyqtSignal, QByteArray, QDataStream, QIODevice, QAbstractTableModel, QSortFilterProxyModel, QDateTime, QFile
 from PyQt6.QtWebEngineWidgets import QWebEngineView
-from PyQt6.QtWebEngineCore import QWebEnginePage , QWebEngineDownloadRequest, QWebEngineProfile, QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo, QWebEnginePage as CorePage
-from PyQt6.QtWidgets import *
+from PyQt6.QtWebEngineCore import QWebEnginePage , QWebEngineDownloadRequest, QWebEngineProfile, QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo, QWebEngineScript, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob, QWebEnginePage as CorePage
+from PyQt6.QtWidgets import (
+    QAbstractItemView, QApplication, QCompleter, QDialog, QDockWidget, QFileDialog, QGroupBox, QHBoxLayout,
+    QHeaderView, QLabel, QLineEdit, QListView, QListWidget, QListWidgetItem, QMainWindow, QMenu, QMessageBox,
+    QPushButton, QSizePolicy, QSpinBox, QTableView, QTabWidget, QToolBar, QToolButton,
+    QVBoxLayout, QWidget,
+)
 from PyQt6 import QtGui
-from PyQt6.QtGui import QAction, QIcon
-from PyQt6.QtNetwork import QNetworkCookieJar, QNetworkCookie
+from PyQt6.QtGui import QAction, QIcon, QDesktopServices
+from PyQt6.QtNetwork import QNetworkCookie
+from adblock import shared_engine, url_host
+from telemetry import (stats_from_environment, process_rss, PageStats, TabMetrics, metrics_log_from_environment,
+                       startup_timeline_from_environment)
+from history_store import shared_history
+from cosmetic import shared_cosmetic_filters
+from lite import shared_lite_mode
+from snapshots import SNAPSHOT_DIR, SnapshotCache, snapshot_key
+from tracing import tracer, traced, chromium_trace_flags, GuiProfiler
+from cookies import Cookie, CookieIndex, read_cookie_file, write_cookie_file
+from downloads import DownloadQueue, QUEUED, COMPLETED, CANCELLED, FAILED, format_bytes, format_eta
+
+# Marks are always taken; SBROWS_STARTUP_LOG prints them and appends them to startup_timeline.jsonl
+startup_timeline = startup_timeline_from_environment(PROCESS_STARTED)
+startup_timeline.mark('imports')
+gui_profiler = GuiProfiler()
 
 
 # ✅ Optional: Enable media stream in Chromium backend
-os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = "--enable-media-stream"
+# SBROWS_TRACE=1 adds Chromium's own tracing, to merge with the Python spans (see tracing.py)
+os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = " ".join(["--enable-media-stream"] + chromium_trace_flags())
+
+
+# Map Qt resource types onto the filter-list option names ($script, $image, ...)
+_ResourceType = QWebEngineUrlRequestInfo.ResourceType
+RESOURCE_TYPE_NAMES = {
+    _ResourceType.ResourceTypeMainFrame: 'document',
+    _ResourceType.ResourceTypeSubFrame: 'subdocument',
+    _ResourceType.ResourceTypeStylesheet: 'stylesheet',
+    _ResourceType.ResourceTypeScript: 'script',
+    _ResourceType.ResourceTypeImage: 'image',
+    _ResourceType.ResourceTypeFavicon: 'image',
+    _ResourceType.ResourceTypeFontResource: 'font',
+    _ResourceType.ResourceTypeMedia: 'media',
+    _ResourceType.ResourceTypeObject: 'object',
+    _ResourceType.ResourceTypePluginResource: 'object',
+    _ResourceType.ResourceTypeXhr: 'xmlhttprequest',
+    _ResourceType.ResourceTypePing: 'ping',
+    _ResourceType.ResourceTypeCspReport: 'ping',
+}
+if hasattr(_ResourceType, 'ResourceTypeWebSocket'):
+    RESOURCE_TYPE_NAMES[_ResourceType.ResourceTypeWebSocket] = 'websocket'
+
+MAX_C_INT = 2 ** 31 - 1
+
+
+def env_int(name, default, unit=""):
+    """A whole number from the environment; bad values fall back to ``default``."""
+    value = os.environ.get(name, "")
+    try:
+        return int(value) if value.strip() else default
+    except ValueError:
+        print(f"Ignoring {name}={value!r}: not a whole number{' of ' + unit if unit else ''}")
+        return default
+
+
+def env_megabytes(name, default):
+    """A size in MB from the environment, in bytes; bad values fall back to ``default``.
+
+    Clamped to a C int, which is what Qt's size setters take.
+    """
+    megabytes = env_int(name, default, "MB")
+    return min(max(megabytes, 0) * 1024 * 1024, MAX_C_INT)
+
+
+HOME_URL = os.environ.get("SBROWS_HOME_URL", "https://google.com")  # about:blank starts fastest
+
+# Persistent profile shared by every tab of a window group
+PROFILE_NAME = "sbrows"
+PROFILE_DIR = os.environ.get("SBROWS_PROFILE_DIR")  # None keeps Qt's per-profile storage location
+HTTP_CACHE_DIR = os.environ.get("SBROWS_CACHE_DIR")  # None keeps Qt's per-profile cache location
+HTTP_CACHE_MAX_BYTES = env_megabytes("SBROWS_CACHE_MB", 512)
+COSMETIC_FILTERING = os.environ.get("SBROWS_COSMETIC", "1") != "0"  # element hiding from the ## rules
+
+# Opt-in MHTML snapshots of the links.txt pages, shown at once while the live page loads
+SNAPSHOTS_ENABLED = os.environ.get("SBROWS_SNAPSHOTS", "0") == "1"
+SNAPSHOT_MAX_BYTES = env_megabytes("SBROWS_SNAPSHOT_MB", 200)
+SNAPSHOT_SCHEME = "snapshot"
+if SNAPSHOTS_ENABLED:
+    # Custom schemes have to be registered before the QApplication exists
+    _snapshot_scheme = QWebEngineUrlScheme(SNAPSHOT_SCHEME.encode())
+    _snapshot_scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    _snapshot_scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme | QWebEngineUrlScheme.Flag.LocalScheme)
+    QWebEngineUrlScheme.registerScheme(_snapshot_scheme)
+
+# Background tab lifecycle: idle tabs are frozen, then discarded; an RSS budget discards sooner
+TAB_FREEZE_AFTER_SECONDS = 5 * 60
+TAB_DISCARD_AFTER_SECONDS = 30 * 60
+MEMORY_BUDGET_BYTES = env_megabytes("SBROWS_MEMORY_BUDGET_MB", 2048)
+LIFECYCLE_CHECK_INTERVAL_MS = 15 * 1000
+
+SESSION_PATH = 'session.json'
+SESSION_SAVE_DELAY_MS = 2000
+
+HISTORY_PAGE_SIZE = 200          # rows the history dialog reads from the store at a time
+HISTORY_SEARCH_DELAY_MS = 150
+COMPLETION_HISTORY_LIMIT = 200000  # history rows loaded into the URL bar completion index
+COMPLETION_LIMIT = 10
+COMPLETION_INDEX_DELAY_MS = 3000  # build the index once startup is over, or on the first keystroke
+COOKIES_CHANGED_DELAY_MS = 200  # cookie list refreshes wait for a burst of changes to settle
+DOWNLOAD_DIR = os.environ.get("SBROWS_DOWNLOAD_DIR")  # None keeps Qt's default, the user's Downloads folder
+DOWNLOAD_ASK = os.environ.get("SBROWS_DOWNLOAD_ASK", "1") != "0"  # 0 saves into DOWNLOAD_DIR without asking
+MAX_ACTIVE_DOWNLOADS = min(max(env_int("SBROWS_MAX_DOWNLOADS", 3), 1), 16)  # the panel's spin box range
+DOWNLOAD_REFRESH_MS = 500        # progress is sampled at this rate, not on every progress signal
+DOWNLOAD_HISTORY_LIMIT = 200     # earlier downloads listed in the downloads panel
+STATS_FLUSH_INTERVAL_MS = 15 * 1000
+BLOCKED_PANEL_REFRESH_MS = 1000
+TASK_MANAGER_REFRESH_MS = 1000
+UI_FRAME_MS = 16  # tab bar and URL bar updates from page signals are applied at most once a frame
+METRICS_LOG_INTERVAL_MS = 5 * 1000  # how often SBROWS_METRICS_LOG gets a snapshot of every tab
+
+
+_icons = {}
+
+
+def cached_icon(path):
+    """Icon loaded from disk once per process."""
+    icon = _icons.get(path)
+    if icon is None:
+        icon = _icons[path] = QIcon(path)
+    return icon
+
+
+def page_key(qurl):
+    """Key under which blocked requests are attributed to a page."""
+    return qurl.toString(QUrl.UrlFormattingOption.RemoveFragment)
 
 
 class AdBlocker(QWebEngineUrlRequestInterceptor):
+    def __init__(self, engine=None, stats=None, lite=None, parent=None):
+        super().__init__(parent)
+        # One engine per process, memory-mapped from the compiled filter cache
+        self.engine = engine if engine is not None else shared_engine()
+        self.stats = stats if stats is not None else stats_from_environment()
+        self.lite = lite if lite is not None else shared_lite_mode()
+
+        # Stats are written out from the GUI thread, never from interceptRequest
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.stats.flush)
+        self.flush_timer.start(STATS_FLUSH_INTERVAL_MS)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stats.flush)
+
+    @traced('interceptRequest', 'adblock')
     def interceptRequest(self, info: QWebEngineUrlRequestInfo):
         url = info.requestUrl().toString()
+        page_url = page_key(info.firstPartyUrl())
+        resource_type = RESOURCE_TYPE_NAMES.get(info.resourceType(), 'other')
+        self.stats.count_request(page_url)
 
-        ad_domains = [
-            'doubleclick.net', 'googleadservices.com', 'ads.youtube.com', 
-            'pagead2.googlesyndication.com', 'adnxs.com', 'trackcmp.net', 
-            'adroll.com', 'googlesyndication.com', 'securepubads.g.doubleclick.net', 
-            'ytads.youtube.com', 'static.wolf-327b.com', 'cdn.wolf-327b.com', 
-            'acdn.tsyndicate.com', 'adservice.google.com'
-        ]
-
-        if any(domain in url for domain in ad_domains) or re.search(r'\b(ad|track|analytics|advertisement|served)\b', url, re.IGNORECASE):
-            print(f"Blocked: {url}")
+        rule = self.engine.match(url, page_url, resource_type)
+        if rule is not None:
             info.block(True)
+            self.stats.record(url, url_host(url), rule.text, page_url, resource_type)
+        elif self.lite.active:
+            page_host = info.firstPartyUrl().host()
+            if self.lite.skip(page_host, info.requestUrl().host(), resource_type):
+                info.block(True)
+                self.lite.record(page_host, resource_type)
+
+
+# Adds a hiding stylesheet as the document is created, before anything is laid out.
+# The generic sheet is kept on the document so a site's own sheet can take its place.
+HIDE_SCRIPT_SOURCE = """(function () {
+    var css = %s, generic = %s, replacesGeneric = %s;
+    if (generic && document.__sbrowsNoGeneric) return;
+    function add(text) {
+        if (window.CSSStyleSheet && 'adoptedStyleSheets' in document) {
+            var sheet = new CSSStyleSheet();
+            sheet.replaceSync(text);
+            document.adoptedStyleSheets = document.adoptedStyleSheets.concat([sheet]);
+            return sheet;
+        }
+        var style = document.createElement('style');
+        style.textContent = text;
+        (document.head || document.documentElement).appendChild(style);
+        return style;
+    }
+    if (replacesGeneric) {
+        document.__sbrowsNoGeneric = true;
+        var old = document.__sbrowsGeneric;
+        if (old instanceof Node) old.remove();
+        else if (old) document.adoptedStyleSheets = document.adoptedStyleSheets.filter(function (s) { return s !== old; });
+    }
+    if (css) {
+        var sheet = add(css);
+        if (generic) document.__sbrowsGeneric = sheet;
+    }
+})();"""
+GENERIC_HIDE_SCRIPT = "sbrows-hide-generic"
+SITE_HIDE_SCRIPT = "sbrows-hide-site"
+
+
+def hide_script(name, css, generic=False, replaces_generic=False):
+    script = QWebEngineScript()
+    script.setName(name)
+    script.setSourceCode(HIDE_SCRIPT_SOURCE % (json.dumps(css), json.dumps(generic), json.dumps(replaces_generic)))
+    script.setInjectionPoint(QWebEngineScript.InjectionPoint.DocumentCreation)
+    script.setWorldId(QWebEngineScript.ScriptWorldId.ApplicationWorld)
+    script.setRunsOnSubFrames(generic)  # site rules are for the main frame's host
+    return script
 
 
 class CustomWebEngineProfile(QWebEngineProfile):
-    def __init__(self, parent=None):
+    def __init__(self, name=PROFILE_NAME, cache_dir=HTTP_CACHE_DIR, cache_max_bytes=HTTP_CACHE_MAX_BYTES, parent=None):
+        # A named profile is disk-backed; an empty name would be off-the-record
+        super().__init__(name, parent)
+        if PROFILE_DIR:
+            self.setPersistentStoragePath(os.path.join(PROFILE_DIR, name))
+
+        # Bounded on-disk HTTP cache so revisits of heavy sites skip the network
+        self.setHttpCacheType(QWebEngineProfile.HttpCacheType.DiskHttpCache)
+        self.setHttpCacheMaximumSize(cache_max_bytes)
+        if cache_dir:
+            self.setCachePath(cache_dir)
+        self.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.ForcePersistentCookies)
+
+        # One interceptor for every page on this profile; keep a reference so it isn't collected
+        self.interceptor = AdBlocker(parent=self)
+        self.setUrlRequestInterceptor(self.interceptor)
+
+        # Generic element hiding is one script for the whole profile; pages add their site's rules
+        self.cosmetic = shared_cosmetic_filters() if COSMETIC_FILTERING else None
+        if self.cosmetic is not None and self.cosmetic.generic:
+            self.scripts().insert(hide_script(GENERIC_HIDE_SCRIPT, self.cosmetic.generic_stylesheet, generic=True))
+
+        # The download manager is created with the first download
+        self._downloads = None
+        if DOWNLOAD_DIR:
+            self.setDownloadPath(DOWNLOAD_DIR)
+        self.downloadRequested.connect(self.handle_download)
+
+        # The store loads its cookies asynchronously and says nothing when it is done,
+        # so the index starts filling now rather than on the first clear or export
+        self.cookies = CookieManager(self.cookieStore(), self)
+
+        self.snapshots = None
+        if SNAPSHOTS_ENABLED:
+            self.snapshots = SnapshotCache(read_text_file_lines('links.txt'),
+                                           os.path.join(self.persistentStoragePath(), SNAPSHOT_DIR),
+                                           SNAPSHOT_MAX_BYTES)
+            self.snapshot_handler = SnapshotSchemeHandler(self.snapshots, self)
+            self.installUrlSchemeHandler(SNAPSHOT_SCHEME.encode(), self.snapshot_handler)
+            app = QCoreApplication.instance()
+            if app is not None:
+                app.aboutToQuit.connect(self.snapshots.save)  # keeps the recently-used order
+
+    @property
+    def downloads(self):
+        if self._downloads is None:
+            self._downloads = DownloadManager(shared_history(), parent=self)
+        return self._downloads
+
+    @traced(category='downloads')
+    def handle_download(self, download: QWebEngineDownloadRequest):
+        """Ask where to save a download, then start it in the window whose page started it.
+
+        The location must be chosen before this returns, since Qt cancels a
+        request nobody accepted; ``SBROWS_DOWNLOAD_ASK=0`` skips the question.
+        """
+        if self.snapshots is not None and download.isSavePageDownload():
+            path = os.path.join(download.downloadDirectory(), download.downloadFileName())
+            url = self.snapshots.pending.pop(path, None)
+            if url is not None:
+                # A snapshot being saved, not something for the downloads panel
+                download.isFinishedChanged.connect(
+                    lambda download=download, url=url, path=path: self.snapshot_saved(download, url, path))
+                download.accept()
+                return
+        main_window = getattr(download.page(), 'main_window', None)
+        if main_window is None:
+            main_window = QApplication.activeWindow()
+        if not isinstance(main_window, MainWindow):
+            main_window = None
+        if DOWNLOAD_ASK:
+            suggested = os.path.join(download.downloadDirectory(), download.downloadFileName())
+            path, _ = QFileDialog.getSaveFileName(main_window, "Save File", suggested)
+            if not path:
+                download.cancel()
+                return
+            download.setDownloadDirectory(os.path.dirname(path))
+            download.setDownloadFileName(os.path.basename(path))
+        self.downloads.add(download)
+        if main_window is not None:
+            main_window.show_downloads()
+
+
+    def snapshot_saved(self, download, url, path):
+        if download.state() == QWebEngineDownloadRequest.DownloadState.DownloadCompleted:
+            self.snapshots.add(url, path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+class SnapshotSchemeHandler(QWebEngineUrlSchemeHandler):
+    """Serves ``snapshot:<id>`` URLs from the MHTML files of the snapshot cache."""
+
+    def __init__(self, snapshots, parent=None):
+        super().__init__(parent)
+        self.snapshots = snapshots
+
+    def requestStarted(self, job: QWebEngineUrlRequestJob):
+        entry = self.snapshots.by_id(job.requestUrl().path())
+        if entry is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        file = QFile(entry.path, job)  # the job owns the file and closes it when done
+        if not file.open(QFile.OpenModeFlag.ReadOnly):
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        job.reply(b'multipart/related', file)
+
+
+def live_url(qurl, profile):
+    """The page a ``snapshot:`` URL stands for; any other URL is returned as it is.
+
+    Snapshot URLs only mean something to the tab showing them, so this is
+    applied wherever a tab's URL is shown, stored or counted.
+    """
+    if qurl.scheme() == SNAPSHOT_SCHEME:
+        snapshots = getattr(profile, 'snapshots', None)
+        entry = snapshots.by_id(qurl.path()) if snapshots is not None else None
+        if entry is not None:
+            return QUrl(entry.url)
+    return qurl
+
+
+def cookie_from_qt(qt_cookie):
+    expires = None
+    if not qt_cookie.isSessionCookie():
+        expires = qt_cookie.expirationDate().toSecsSinceEpoch()
+    same_site = ''
+    if hasattr(qt_cookie, 'sameSitePolicy'):
+        same_site = {QNetworkCookie.SameSite.Lax: 'lax', QNetworkCookie.SameSite.Strict: 'strict',
+                     QNetworkCookie.SameSite.None_: 'none'}.get(qt_cookie.sameSitePolicy(), '')
+    domain = qt_cookie.domain()
+    return Cookie(bytes(qt_cookie.name()).decode('utf-8', 'replace'),
+                  bytes(qt_cookie.value()).decode('utf-8', 'replace'),
+                  domain, qt_cookie.path(), expires, qt_cookie.isSecure(), qt_cookie.isHttpOnly(),
+                  host_only=not domain.startswith('.'), same_site=same_site)
+
+
+def cookie_to_qt(cookie):
+    qt_cookie = QNetworkCookie(cookie.name.encode('utf-8'), cookie.value.encode('utf-8'))
+    qt_cookie.setDomain(cookie.domain if not cookie.host_only else cookie.domain.lstrip('.'))
+    qt_cookie.setPath(cookie.path)
+    qt_cookie.setSecure(cookie.secure)
+    qt_cookie.setHttpOnly(cookie.http_only)
+    if cookie.expires is not None:
+        qt_cookie.setExpirationDate(QDateTime.fromSecsSinceEpoch(int(cookie.expires)))
+    if cookie.same_site and hasattr(qt_cookie, 'setSameSitePolicy'):
+        qt_cookie.setSameSitePolicy({'lax': QNetworkCookie.SameSite.Lax, 'strict': QNetworkCookie.SameSite.Strict,
+                                     'none': QNetworkCookie.SameSite.None_}[cookie.same_site])
+    return qt_cookie
+
+
+class CookieManager(QObject):
+    """The profile's cookies, indexed by domain from the cookie store's own signals.
+
+    Cookies are set and deleted through QWebEngineCookieStore directly, so
+    HttpOnly and secure cookies work and nothing round-trips through a page.
+    ``changed`` is emitted once a burst of store changes (a page load, an
+    import of thousands of cookies) has settled.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, store, parent=None):
         super().__init__(parent)
-        self.setUrlRequestInterceptor(AdBlocker())  # Set your ad blocker if needed
+        self.store = store
+        self.index = CookieIndex()
+        self.changed_timer = QTimer(self)
+        self.changed_timer.setSingleShot(True)
+        self.changed_timer.setInterval(COOKIES_CHANGED_DELAY_MS)
+        self.changed_timer.timeout.connect(self.changed.emit)
+
+        store.cookieAdded.connect(self.on_cookie_added)
+        store.cookieRemoved.connect(self.on_cookie_removed)
+        store.loadAllCookies()  # existing cookies arrive through cookieAdded
+
+    def on_cookie_added(self, qt_cookie):
+        self.index.add(cookie_from_qt(qt_cookie))
+        self.changed_timer.start()
+
+    def on_cookie_removed(self, qt_cookie):
+        self.index.remove(cookie_from_qt(qt_cookie))
+        self.changed_timer.start()
+
+    def set_cookies(self, cookies):
+        """Add cookies to the store in one pass; returns how many were set."""
+        count = 0
+        for cookie in cookies:
+            host = cookie.host
+            if not cookie.name or not host:
+                continue
+            scheme = 'https' if cookie.secure else 'http'
+            qt_cookie = cookie_to_qt(cookie)
+            if cookie.host_only:
+                # Chromium turns any domain= attribute into a domain cookie; the origin scopes it instead
+                qt_cookie.setDomain('')
+            self.store.setCookie(qt_cookie, QUrl(f"{scheme}://{host}{cookie.path}"))
+            count += 1
+        return count
+
+    def delete_domain(self, domain, include_subdomains=True):
+        """Delete the cookies of one site; returns how many were deleted."""
+        cookies = self.index.for_domain(domain, include_subdomains)
+        for cookie in cookies:
+            self.store.deleteCookie(cookie_to_qt(cookie))
+        return len(cookies)
+
+    def delete_all(self):
+        self.store.deleteAllCookies()
+
+    def import_file(self, path):
+        """Set every cookie of a Netscape or JSON cookie file."""
+        return self.set_cookies(read_cookie_file(path))
+
+    def export_file(self, path, domains=None):
+        """Write the cookies of ``domains`` (default all) as JSON (.json) or Netscape; returns the count."""
+        if domains is None:
+            cookies = self.index.all()
+        else:
+            cookies = [cookie for domain in domains for cookie in self.index.for_domain(domain, False)]
+        write_cookie_file(path, cookies)
+        return len(cookies)
 
-        # Initialize cookie store
-        self.cookie_store = self.cookieStore()
 
-    def get_cookies(self, url):
-        """Get cookies for a specific URL."""
-        cookies = self.cookie_store.cookiesForUrl(QUrl(url))
-        return cookies
+class DownloadManager(QObject):
+    """A profile's downloads: run a few at a time, sampled on a timer and recorded in history.
 
-    def set_cookie(self, page: QWebEnginePage, cookie_dict: dict):
-        """Inject cookies using JavaScript."""
-        for key, value in cookie_dict.items():
-            js_code = f"document.cookie = '{key}={value}; path=/';"
-            page.runJavaScript(js_code)
+    ``changed`` is emitted when a download is added or finishes and on each
+    progress sample, never more than a few times a second.
+    """
 
+    changed = pyqtSignal()
 
-    def clear_cookies(self):
-        """Clear all cookies."""
-        self.cookie_store.deleteAllCookies()
+    def __init__(self, history, max_active=MAX_ACTIVE_DOWNLOADS, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.queue = DownloadQueue(max_active)
+        self.timer = QTimer(self)
+        self.timer.setInterval(DOWNLOAD_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    @traced(category='downloads')
+    def add(self, request):
+        request.accept()
+        path = os.path.join(request.downloadDirectory(), request.downloadFileName())
+        download = self.queue.add(request, request.url().toString(), path)
+        request.isFinishedChanged.connect(lambda download=download: self.on_finished(download))
+        self.timer.start()
+        self.changed.emit()
+        return download
+
+    @traced(category='downloads')
+    def on_finished(self, download):
+        state = download.request.state()
+        if state == QWebEngineDownloadRequest.DownloadState.DownloadCompleted:
+            self.queue.finish(download, COMPLETED)
+        elif state == QWebEngineDownloadRequest.DownloadState.DownloadCancelled:
+            self.queue.finish(download, CANCELLED)
+        else:
+            self.queue.finish(download, FAILED, download.request.interruptReasonString())
+        self.history.add_download(download.url, download.path, download.state, download.received,
+                                  download.started, download.finished)
+        self.changed.emit()
+
+    def pause(self, downloads):
+        for download in downloads:
+            self.queue.pause(download)
+        self.changed.emit()
+
+    def resume(self, downloads):
+        for download in downloads:
+            self.queue.resume(download)
+        self.timer.start()
+        self.changed.emit()
+
+    def cancel(self, downloads):
+        for download in downloads:
+            self.queue.cancel(download)
+        self.changed.emit()
+
+    def set_max_active(self, max_active):
+        self.queue.set_max_active(max_active)
+        self.changed.emit()
+
+    def clear_finished(self):
+        """Forget finished downloads, here and in the stored download history."""
+        self.queue.clear_finished()
+        self.history.clear_downloads()
+        self.changed.emit()
+
+    @traced(category='downloads')
+    def refresh(self):
+        if not self.queue.sample():
+            self.timer.stop()
+        self.changed.emit()
+
+    def summary(self):
+        queue = self.queue
+        active, waiting = queue.active_count(), queue.count(QUEUED)
+        if not active and not waiting:
+            return "No active downloads"
+        text = f"{active} downloading, {waiting} queued — {format_bytes(queue.throughput())}/s"
+        eta = queue.eta()
+        return f"{text}, {format_eta(eta)} left" if eta is not None else text
 
 
 class CustomWebEnginePage(QWebEnginePage):
-    def __init__(self, parent=None, main_window=None):
-        super().__init__(parent)
+    def __init__(self, profile, parent=None, main_window=None):
+        super().__init__(profile, parent)
         self.main_window = main_window
+        self.tab = None               # set by the BrowserTab that shows this page
+        self.is_revalidation = False  # loading the live page behind a snapshot
+        self.revalidation = None
+        self.request_stats = PageStats()  # this page's requests since it last navigated
+        self.tracked_url = None
         self.featurePermissionRequested.connect(self.handle_feature_permission)
-        
+        self.loadFinished.connect(self.on_load_finished)
+        self.urlChanged.connect(self.track_requests)
+
+    def acceptNavigationRequest(self, url, navigation_type, is_main_frame):
+        if is_main_frame:
+            if self.serve_snapshot(url, navigation_type):
+                return False
+            self.apply_site_hiding(url)
+            self.track_requests(url, fresh=True)
+        return super().acceptNavigationRequest(url, navigation_type, is_main_frame)
+
+    def track_requests(self, url, fresh=False):
+        """Count the requests made with ``url`` as first party for this page; ``fresh`` starts over."""
+        interceptor = getattr(self.profile(), 'interceptor', None)
+        key = page_key(url)
+        if interceptor is None or (key == self.tracked_url and not fresh):
+            return
+        if fresh:
+            self.request_stats = PageStats()
+        interceptor.stats.track_page(key, self.request_stats, self.tracked_url)
+        self.tracked_url = key
+
+    def serve_snapshot(self, url, navigation_type):
+        """Show the snapshot of ``url`` instead, if there is one; the live page loads behind it."""
+        snapshots = getattr(self.profile(), 'snapshots', None)
+        if (snapshots is None or self.is_revalidation or self.tab is None
+                or navigation_type == CorePage.NavigationType.NavigationTypeReload):
+            return False
+        entry = snapshots.get(url.toString())
+        if entry is None:
+            return False
+        # The live page takes over this page's history, going to the entry asked for
+        # on back/forward and adding one otherwise; read it before the snapshot loads
+        history = serialize_history(self)
+        target = None
+        if navigation_type == CorePage.NavigationType.NavigationTypeBackForward:
+            target = self.history_index_of(url)
+            if target is None:
+                return False
+        # A page can't start another navigation from inside this callback
+        QTimer.singleShot(0, lambda: self.show_snapshot(entry, url, history, target))
+        return True
+
+    def history_index_of(self, url):
+        """Index of the history entry nearest the current one with ``url``, or None."""
+        items = self.history().items()
+        current = self.history().currentItemIndex()
+        found = [index for index, item in enumerate(items) if item.url() == url]
+        return min(found, key=lambda index: abs(index - current)) if found else None
+
+    def show_snapshot(self, entry, url, history=None, target=None):
+        self.setUrl(QUrl(f"{SNAPSHOT_SCHEME}:{entry.id}"))
+        if self.revalidation is not None:
+            self.revalidation.deleteLater()
+        live = self.revalidation = CustomWebEnginePage(self.profile(), self.parent(), main_window=self.main_window)
+        live.is_revalidation = True
+        live.loadFinished.connect(lambda ok, live=live: self.on_revalidated(live, url, ok))
+        if history and restore_history(live, history):
+            items = live.history().items()
+            if target is not None and target < len(items):
+                live.history().goToItem(items[target])
+                return
+        live.setUrl(url)
+
+    def on_revalidated(self, live, url, ok):
+        """Put the live page in place of the snapshot, unless the user has moved on."""
+        if live is not self.revalidation:
+            return
+        if not ok and snapshot_key(live.url().toString()) != snapshot_key(url.toString()):
+            return  # the restored entry's load, cut short by the one for ``url``
+        self.revalidation = None
+        if not ok or self.url().scheme() != SNAPSHOT_SCHEME or self.tab is None or self.tab.page is not self:
+            live.deleteLater()  # offline, or no longer shown: the snapshot stays as it is
+            return
+        live.is_revalidation = False
+        self.tab.replace_page(live)
+        if self.main_window is not None:
+            self.main_window.update_history(live.url(), live.title())
+        live.on_load_finished(True)
+
+    def on_load_finished(self, ok):
+        snapshots = getattr(self.profile(), 'snapshots', None)
+        if ok and snapshots is not None and not self.is_revalidation and snapshots.needs_snapshot(self.url().toString()):
+            path = snapshots.new_path(self.url().toString())
+            snapshots.pending[path] = self.url().toString()
+            self.save(path, QWebEngineDownloadRequest.SavePageFormat.MimeHtmlSaveFormat)
+
+    def apply_site_hiding(self, url):
+        """Swap in the element hiding rules of the site about to load; they run at document creation."""
+        cosmetic = getattr(self.profile(), 'cosmetic', None)
+        if cosmetic is None:
+            return
+        scripts = self.scripts()
+        for script in scripts.find(SITE_HIDE_SCRIPT):
+            scripts.remove(script)
+
+        host = url.host()
+        if not host:
+            return
+        if self.profile().interceptor.engine.is_allowlisted(url.toString()):
+            css, replaces_generic = '', True  # no hiding at all where blocking is off
+        else:
+            css, replaces_generic = cosmetic.site_stylesheet(host)
+        if css or replaces_generic:
+            scripts.insert(hide_script(SITE_HIDE_SCRIPT, css, replaces_generic=replaces_generic))
 
     def handle_feature_permission(self, url, feature):
         if feature in (
@@ -113,25 +697,311 @@ class CustomWebEnginePage(QWebEnginePage):
     
 
 
+def serialize_history(page):
+    """Navigation history of a page (with each entry's scroll state) as base64 text.
+
+    None for a history with snapshot entries, which would not outlive the snapshots.
+    """
+    if any(item.url().scheme() == SNAPSHOT_SCHEME for item in page.history().items()):
+        return None
+    data = QByteArray()
+    stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
+    try:
+        stream << page.history()
+    except TypeError:
+        return None  # bindings without QWebEngineHistory streaming
+    return bytes(data.toBase64()).decode('ascii')
+
+
+def restore_history(page, state):
+    """Load history saved by serialize_history into a page; it navigates to the current entry."""
+    stream = QDataStream(QByteArray.fromBase64(state.encode('ascii')), QIODevice.OpenModeFlag.ReadOnly)
+    try:
+        stream >> page.history()
+    except TypeError:
+        return False
+    return stream.status() == QDataStream.Status.Ok
+
+
 class BrowserTab(QWidget):
-    def __init__(self, main_window=None):
+    def __init__(self, main_window=None, url=None, title="New Tab", history_state=None):
         super().__init__()
         self.main_window = main_window
         self.layout = QVBoxLayout(self)
+        self.setLayout(self.layout)
+
+        # Until the tab is first shown it is only a placeholder for what to load
+        self.browser = None
+        self.page = None
+        self.pending_url = url if url is not None else QUrl()
+        self.pending_title = title
+        self.pending_history = history_state
+
+        self.indexed_url = ''  # URL this tab is counted under in the completion index
+        self.pinned = False
+        self.last_active = time.monotonic()
+        self.metrics = TabMetrics()
+        self.load_progress = 100
+
+    def materialize(self):
+        """Create the web view and load what the placeholder stood for."""
+        if self.browser is not None:
+            return
         self.browser = QWebEngineView()
+        profile = self.main_window.profile if self.main_window else get_profile()
+        self.page = CustomWebEnginePage(profile, self.browser, main_window=self.main_window)
+        self.page.tab = self
+        self.browser.setPage(self.page)
+        self.layout.addWidget(self.browser)
+        if self.main_window:
+            self.main_window.connect_tab(self)
 
-        self.interceptor = AdBlocker()
-        QWebEngineProfile.defaultProfile().setUrlRequestInterceptor(self.interceptor)
+        if self.pending_history and restore_history(self.page, self.pending_history):
+            pass
+        elif not self.pending_url.isEmpty():
+            self.browser.setUrl(self.pending_url)
+        self.pending_history = None
 
-        self.page = CustomWebEnginePage(self.browser, main_window=self.main_window)
-        self.browser.setPage(self.page)
+    def replace_page(self, page):
+        """Show another page in this tab, e.g. the live page loaded behind a snapshot."""
+        old, self.page = self.page, page
+        page.tab = self
+        self.browser.setPage(page)
+        old.tab = None
+        old.deleteLater()
 
-        self.browser.setUrl(QUrl("https://google.com"))
-        self.layout.addWidget(self.browser)
-        self.setLayout(self.layout)
+    def url(self):
+        """The page shown, or the live page when that is a snapshot of it."""
+        return live_url(self.browser.url(), self.page.profile()) if self.browser is not None else self.pending_url
 
-    def createWindow(self, type: int) -> 'QWebEngineView':
-        return self.browser
+    def title(self):
+        return self.browser.title() if self.browser is not None else self.pending_title
+
+    def session_state(self):
+        history = serialize_history(self.page) if self.page is not None else self.pending_history
+        return {'url': self.url().toString(), 'title': self.title(), 'pinned': self.pinned, 'history': history}
+
+
+class TabLifecycleManager(QObject):
+    """Freezes and discards background tabs by idle time and an RSS budget.
+
+    Tabs are visited least recently used first.  Pinned tabs, tabs playing
+    audio and the current tab are left alone, and no tab is pushed below the
+    state Qt recommends for it.  A discarded tab reloads when it is shown again.
+    """
+
+    def __init__(self, tabs, parent=None):
+        super().__init__(parent)
+        self.tabs = tabs
+        self.current = None
+        self.tabs.currentChanged.connect(self.on_current_changed)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(LIFECYCLE_CHECK_INTERVAL_MS)
+
+    def on_current_changed(self, index):
+        # The tab being left starts its idle time now
+        if self.current is not None:
+            self.current.last_active = time.monotonic()
+        tab = self.tabs.widget(index)
+        self.current = tab if isinstance(tab, BrowserTab) else None
+        if self.current is not None:
+            self.current.last_active = time.monotonic()
+            if self.current.page is not None:
+                self.set_state(self.current, QWebEnginePage.LifecycleState.Active)
+
+    def background_tabs(self):
+        """Tabs that may be frozen or discarded, least recently used first."""
+        tabs = []
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if (isinstance(tab, BrowserTab) and tab.page is not None and tab is not self.tabs.currentWidget()
+                    and not tab.pinned and not tab.page.recentlyAudible()):
+                tabs.append(tab)
+        return sorted(tabs, key=lambda tab: tab.last_active)
+
+    def set_state(self, tab, state):
+        if tab.page.lifecycleState() == state:
+            return False
+        # Going below the recommended state could lose form input or stop audio
+        if state.value > tab.page.recommendedState().value:
+            return False
+        tab.page.setLifecycleState(state)
+        return True
+
+    def check(self):
+        now = time.monotonic()
+        tabs = self.background_tabs()
+        for tab in tabs:
+            idle = now - tab.last_active
+            if idle >= TAB_DISCARD_AFTER_SECONDS:
+                self.set_state(tab, QWebEnginePage.LifecycleState.Discarded)
+            elif idle >= TAB_FREEZE_AFTER_SECONDS:
+                self.set_state(tab, QWebEnginePage.LifecycleState.Frozen)
+
+        # Over budget: discard the least recently used tab; memory is measured again next check
+        if MEMORY_BUDGET_BYTES and self.memory_usage() > MEMORY_BUDGET_BYTES:
+            for tab in tabs:
+                if self.set_state(tab, QWebEnginePage.LifecycleState.Discarded):
+                    break
+
+    def memory_usage(self):
+        """RSS of the browser process plus every renderer process its tabs use."""
+        pids = {os.getpid()}
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if isinstance(tab, BrowserTab) and tab.page is not None:
+                pids.add(tab.page.renderProcessPid())
+        return sum(process_rss(pid) for pid in pids)
+
+
+class TabUpdateScheduler(QObject):
+    """Applies tab bar and URL bar updates from page signals in one pass per frame.
+
+    Page signals only mark what changed on which tab.  At the next frame the
+    latest title, progress, icon and URL of each marked tab are applied once;
+    text and icons that haven't changed are left alone, and the URL bar only
+    follows the current tab.  Nothing is applied while the window is minimized.
+    """
+
+    TEXT, ICON, URL = 'text', 'icon', 'url'
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.pending = {}  # tab -> set of parts to refresh
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(UI_FRAME_MS)
+        self.timer.timeout.connect(self.flush)
+        self.counters = Counter()
+
+    def request(self, tab, *parts):
+        self.counters['requested'] += len(parts)
+        self.pending.setdefault(tab, set()).update(parts)
+        if not self.timer.isActive() and not self.window.isMinimized():
+            self.timer.start()
+
+    def resume(self):
+        """Apply what piled up while the window was minimized."""
+        if self.pending and not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        if self.window.isMinimized():
+            return
+        pending, self.pending = self.pending, {}
+        self.counters['frames'] += 1
+        tabs = self.window.tabs
+        current = tabs.currentWidget()
+        for tab, parts in pending.items():
+            index = tabs.indexOf(tab)
+            if index < 0 or tab.browser is None:
+                self.counters['skipped'] += len(parts)
+                continue
+            loading = tab.metrics.loading
+            if self.TEXT in parts:
+                text = f"{tab.load_progress}% - loading..." if loading else tab.browser.title()
+                self.count(self.window.update_tab_title(text, tab))
+            if self.ICON in parts:
+                icon = cached_icon("loading.gif") if loading else tab.browser.icon()
+                if tabs.tabIcon(index).cacheKey() != icon.cacheKey():
+                    tabs.setTabIcon(index, icon)
+                    self.count(True)
+                else:
+                    self.count(False)
+            if self.URL in parts:
+                self.count(tab is current and self.window.update_url_bar(tab.browser.url()))
+
+    def count(self, applied):
+        self.counters['applied' if applied else 'skipped'] += 1
+
+    def summary(self):
+        requested = self.counters['requested']
+        applied = self.counters['applied']
+        avoided = requested - applied
+        share = f" ({avoided * 100 // requested}%)" if requested else ""
+        return f"UI updates: {requested} requested, {applied} applied, {avoided} avoided{share}"
+
+
+class SessionManager(QObject):
+    """Saves the open windows and tabs, and restores them with only the active tabs loaded."""
+
+    def __init__(self, path=SESSION_PATH, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.windows = []
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(SESSION_SAVE_DELAY_MS)
+        self.save_timer.timeout.connect(self.save)
+
+    def register(self, window):
+        self.windows.append(window)
+        self.schedule_save()
+
+    def window_closed(self, window):
+        # The last window's tabs are what the next start should bring back
+        if len(self.windows) > 1 and window in self.windows:
+            self.windows.remove(window)
+        self.save()
+
+    def schedule_save(self):
+        """Save shortly, coalescing bursts of tab changes into one write."""
+        self.save_timer.start()
+
+    def save(self):
+        self.save_timer.stop()
+        state = {'windows': [window.session_state() for window in self.windows]}
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save session: {e}")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file).get('windows', [])
+        except (OSError, ValueError, AttributeError):
+            return []
+
+    def restore(self):
+        """Open the windows of the saved session; returns them, or an empty list if there was none."""
+        windows = []
+        for state in self.load():
+            if state.get('tabs'):
+                window = MainWindow(session_state=state)
+                window.showMaximized()
+                windows.append(window)
+        return windows
+
+
+_session = None
+
+
+def get_session():
+    """Return the process-wide session manager."""
+    global _session
+    if _session is None:
+        _session = SessionManager()
+    return _session
+
+
+_profiles = {}
+
+
+def get_profile(name=PROFILE_NAME):
+    """Return the shared persistent profile for a window group, creating it on first use."""
+    profile = _profiles.get(name)
+    if profile is None:
+        profile = _profiles[name] = CustomWebEngineProfile(name)
+    return profile
 
 
 def read_text_file_lines(filepath):
@@ -143,24 +1013,528 @@ def read_text_file_lines(filepath):
     return lines
 
 
+def build_completion_index(history):
+    """Index the quick links from links.txt and the most recent history."""
+    from completion import CompletionIndex  # not needed until the index is first built
+
+    index = CompletionIndex()
+    for link in read_text_file_lines('links.txt'):
+        if link.strip():
+            index.add_link(link.strip())
+    for entry in history.recent(COMPLETION_HISTORY_LIMIT):
+        index.add_history(entry.url, entry.title, entry.visit_count, entry.last_visit)
+    # The sorted keys and the frecency order for short prefixes, made here rather than on a keystroke
+    index.compact()
+    index.rerank()
+    return index
+
+
+class BrowserState(QObject):
+    """State every window of the process shares: profile, history, completion index and blocklist.
+
+    Windows change it only through these methods, so the history store and
+    the index are written from one place, and the signals keep the other
+    windows' views in step.
+    """
+
+    history_deleted = pyqtSignal(list)    # URLs removed from history
+    history_cleared = pyqtSignal()
+    site_settings_changed = pyqtSignal(str)  # host whose lite mode was toggled
+    completion_index_ready = pyqtSignal()
+    _completion_index_built = pyqtSignal(object)
+    _completion_index_ranked = pyqtSignal(object, float)
+
+    def __init__(self, profile=None, history=None, parent=None):
+        super().__init__(parent)
+        self.profile = profile if profile is not None else get_profile()
+        self.history = history if history is not None else shared_history()
+        self.completion_index = None   # built once, on first use or after startup
+        self._index_changes = None     # changes made while the index is being built, replayed on it
+        self._ranking = False
+        self.open_tab_urls = Counter()  # URLs of open tabs in every window, for the index's bonus
+        self._completion_index_built.connect(self._install_completion_index)
+        self._completion_index_ranked.connect(self._install_ranking)
+
+    @property
+    def engine(self):
+        return self.profile.interceptor.engine
+
+    @property
+    def lite(self):
+        return self.profile.interceptor.lite
+
+    def ensure_completion_index(self):
+        """Start building the URL bar completion index on the history reader thread.
+
+        Returns the index, or None until it is ready; ``completion_index_ready``
+        is emitted once it is.  A stale frecency order is re-sorted on the
+        same thread, and the index keeps answering from the old one meanwhile.
+        """
+        index = self.completion_index
+        if index is None:
+            if self._index_changes is None:
+                self._index_changes = []
+                self.history.run_read(self._build_completion_index)
+        elif not self._ranking and index.needs_ranking():
+            self._ranking = True
+            self.history.run_read(self._rank_completion_index, index.start_ranking())
+        return index
+
+    def _rank_completion_index(self, entries):
+        from completion import rank_entries
+        now = time.time()
+        self._completion_index_ranked.emit(rank_entries(entries, now), now)
+
+    def _install_ranking(self, ranked, now):
+        self._ranking = False
+        self.completion_index.finish_ranking(ranked, now)
+
+    def _build_completion_index(self):
+        index = None
+        try:
+            self.history.flush()  # visits made so far must be in the store it reads
+            index = build_completion_index(self.history)
+        except sqlite3.Error as e:
+            print(f"Could not build the completion index: {e}")
+        finally:
+            self._completion_index_built.emit(index)
+
+    def _install_completion_index(self, index):
+        changes, self._index_changes = self._index_changes, None
+        if index is None:
+            return  # the next keystroke tries again
+        for method, args in changes:
+            getattr(index, method)(*args)
+        for url, count in self.open_tab_urls.items():
+            for _ in range(count):
+                index.tab_opened(url)
+        self.completion_index = index
+        startup_timeline.mark('completion_index_built')
+        self.completion_index_ready.emit()
+
+    def _update_completion_index(self, method, *args):
+        if self.completion_index is not None:
+            getattr(self.completion_index, method)(*args)
+        elif self._index_changes is not None:
+            self._index_changes.append((method, args))
+
+    def record_visit(self, url, title=''):
+        """Queue a visit for the history store; nothing is written on the GUI thread."""
+        self.history.add_visit(url, title)
+        self._update_completion_index('record_visit', url, title)
+
+    def set_title(self, url, title):
+        self.history.set_title(url, title)
+        self._update_completion_index('set_title', url, title)
+
+    def tab_url_changed(self, old_url, new_url):
+        """Move an open tab's count from one URL to another; either may be empty."""
+        if old_url:
+            self.open_tab_urls[old_url] -= 1
+            if self.open_tab_urls[old_url] <= 0:
+                del self.open_tab_urls[old_url]
+            if self.completion_index is not None:
+                self.completion_index.tab_closed(old_url)
+        if new_url:
+            self.open_tab_urls[new_url] += 1
+            if self.completion_index is not None:
+                self.completion_index.tab_opened(new_url)
+
+    def delete_history(self, urls):
+        # One batched delete; the store writes it out in the background
+        self.history.delete_urls(urls)
+        self._update_completion_index('forget_history', list(urls))
+        self.history_deleted.emit(list(urls))
+
+    def clear_history(self):
+        self.history.clear()
+        self._update_completion_index('clear_history')
+        self.history_cleared.emit()
+
+    def toggle_lite_mode(self, host):
+        enabled = self.lite.toggle(host)
+        self.site_settings_changed.emit(host)
+        return enabled
+
+
+_state = None
+
+
+def shared_state():
+    """Return the process-wide browser state, creating it on first use."""
+    global _state
+    if _state is None:
+        _state = BrowserState()
+    return _state
+
+
+class CompletionModel(QAbstractListModel):
+    """Serves frecency-ranked CompletionIndex results to the URL bar's completer."""
+
+    def __init__(self, state, parent=None):
+        super().__init__(parent)
+        self.state = state  # the index is the shared one, built on first use
+        self.results = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.results[index.row()]
+        if role == Qt.ItemDataRole.EditRole:
+            return entry.url
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{entry.title}  —  {entry.url}" if entry.title else entry.url
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return entry.url
+        return None
+
+    def update_results(self, text):
+        self.beginResetModel()
+        index = self.state.completion_index
+        if index is None or not text.strip():
+            self.results = []
+        else:
+            self.results = index.query(text, COMPLETION_LIMIT)
+        self.endResetModel()
+
+
+def history_day_label(timestamp):
+    """Date heading under which a history entry is grouped."""
+    day = datetime.fromtimestamp(timestamp).date()
+    today = datetime.now().date()
+    if day == today:
+        return "Today"
+    if day == today - timedelta(days=1):
+        return "Yesterday"
+    return day.strftime('%A, %d %B %Y')
+
+
+class HistoryModel(QAbstractListModel):
+    """History rows paged in from the history store as the view scrolls, under date headings.
+
+    Pages are read on the store's reader thread so a slow search never blocks typing.
+    """
+
+    page_loaded = pyqtSignal(int, object)
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.rows = []              # HistoryEntry objects and date heading strings
+        self.filter_text = ''
+        self.generation = 0         # bumped on every new search to drop stale pages
+        self.loading = False
+        self.exhausted = False
+        self.last_entry = None
+        self.last_day = None
+        self.page_loaded.connect(self.add_page)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if isinstance(row, str):
+            if role == Qt.ItemDataRole.DisplayRole:
+                return row
+            if role == Qt.ItemDataRole.FontRole:
+                font = QtGui.QFont()
+                font.setBold(True)
+                return font
+            return None
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            when = datetime.fromtimestamp(row.last_visit).strftime('%H:%M')
+            return f"{when}   {row.title}  —  {row.url}" if row.title else f"{when}   {row.url}"
+        if role in (Qt.ItemDataRole.ToolTipRole, Qt.ItemDataRole.UserRole):
+            return row.url
+        return None
+
+    def flags(self, index):
+        if index.isValid() and isinstance(self.rows[index.row()], str):
+            return Qt.ItemFlag.ItemIsEnabled  # headings can't be selected
+        return super().flags(index)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.loading or self.exhausted:
+            return
+        self.loading = True
+        self.history.run_read(self.load_page, self.generation, self.filter_text, self.last_entry)
+
+    def load_page(self, generation, text, after):
+        entries = None
+        try:
+            entries = self.history.page(text, after, HISTORY_PAGE_SIZE)
+        except sqlite3.Error as e:
+            print(f"Could not read history: {e}")
+        finally:
+            try:
+                self.page_loaded.emit(generation, entries)  # None still ends the load
+            except RuntimeError:
+                pass  # the dialog was closed while the page was loading
+
+    def add_page(self, generation, entries):
+        if generation != self.generation:
+            return
+        self.loading = False
+        if entries is None:
+            return
+        self.exhausted = len(entries) < HISTORY_PAGE_SIZE
+
+        new_rows = []
+        for entry in entries:
+            day = history_day_label(entry.last_visit)
+            if day != self.last_day:
+                new_rows.append(day)
+                self.last_day = day
+            new_rows.append(entry)
+        if entries:
+            self.last_entry = entries[-1]
+        if new_rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(new_rows) - 1)
+            self.rows.extend(new_rows)
+            self.endInsertRows()
+
+    def set_filter(self, text):
+        """Restart paging with only the entries whose URL or title contains ``text``."""
+        self.generation += 1
+        self.beginResetModel()
+        self.filter_text = text
+        self.rows = []
+        self.loading = False
+        self.exhausted = False
+        self.last_entry = None
+        self.last_day = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def clear(self):
+        self.generation += 1
+        self.beginResetModel()
+        self.rows = []
+        self.loading = False
+        self.exhausted = True
+        self.endResetModel()
+
+    def remove_urls(self, urls):
+        """Drop rows for deleted URLs, along with headings left without entries."""
+        urls = set(urls)
+        removed = set()
+        previous_heading = None
+        kept_under_heading = False
+        for row, item in enumerate(self.rows):
+            if isinstance(item, str):
+                if previous_heading is not None and not kept_under_heading:
+                    removed.add(previous_heading)
+                previous_heading, kept_under_heading = row, False
+            elif item.url in urls:
+                removed.add(row)
+            else:
+                kept_under_heading = True
+        if previous_heading is not None and not kept_under_heading and self.exhausted:
+            removed.add(previous_heading)
+
+        # Remove contiguous runs from the bottom up so earlier row numbers stay valid
+        rows = sorted(removed, reverse=True)
+        position = 0
+        while position < len(rows):
+            last = first = rows[position]
+            while position + 1 < len(rows) and rows[position + 1] == first - 1:
+                position += 1
+                first = rows[position]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            self.endRemoveRows()
+            position += 1
+
+
+class TabMetricsModel(QAbstractTableModel):
+    """Task manager rows: load time, requests, renderer and idle time of every tab."""
+
+    COLUMNS = (
+        ('title', "Tab"),
+        ('load_ms', "Load (ms)"),
+        ('requests', "Requests"),
+        ('blocked', "Blocked"),
+        ('renderer_pid', "PID"),
+        ('renderer_rss', "Memory (MB)"),
+        ('idle_seconds', "Idle (s)"),
+        ('state', "State"),
+    )
+    SORT_ROLE = Qt.ItemDataRole.UserRole
+
+    def __init__(self, tabs, parent=None):
+        super().__init__(parent)
+        self.tabs = tabs
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section][1]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        key = self.COLUMNS[index.column()][0]
+        value = row[key]
+        if role == self.SORT_ROLE:
+            return value if value is not None else -1
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return row['url']
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if value is None:
+            return "–"
+        if key == 'renderer_rss':
+            return f"{value / (1024 * 1024):.0f}"
+        if key in ('load_ms', 'idle_seconds'):
+            return f"{value:.0f}"
+        return str(value)
+
+    def snapshot(self):
+        """One dict per tab; renderers shared by several tabs are measured once."""
+        rows = []
+        rss_by_pid = {}
+        now = time.monotonic()
+        current = self.tabs.currentWidget()
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            if not isinstance(tab, BrowserTab):
+                continue
+            url = tab.url()
+            requests = blocked = 0
+            pid = rss = None
+            state = "Not loaded"
+            if tab.page is not None:
+                requests, blocked = tab.page.request_stats.requests, tab.page.request_stats.blocked
+                pid = tab.page.renderProcessPid() or None
+                if pid is not None and pid not in rss_by_pid:
+                    rss_by_pid[pid] = process_rss(pid)
+                rss = rss_by_pid.get(pid)
+                state = "Loading" if tab.metrics.loading else tab.page.lifecycleState().name
+            rows.append({
+                'index': index,
+                'title': tab.title() or url.toString(),
+                'url': url.toString(),
+                'load_ms': tab.metrics.load_ms,
+                'loads': tab.metrics.loads,
+                'failed_loads': tab.metrics.failed_loads,
+                'requests': requests,
+                'blocked': blocked,
+                'renderer_pid': pid,
+                'renderer_rss': rss,
+                'idle_seconds': 0 if tab is current else now - tab.last_active,
+                'state': state,
+            })
+        return rows
+
+    def refresh(self):
+        self.beginResetModel()
+        self.rows = self.snapshot()
+        self.endResetModel()
+
+
+class DownloadsModel(QAbstractTableModel):
+    """This session's downloads, newest first, followed by earlier ones from the history store."""
+
+    COLUMNS = ("File", "Progress", "Speed", "Time left", "State")
+
+    def __init__(self, manager, past=(), parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.past = list(past)
+        self.rows = []
+        self.refresh()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return f"{row.url}\n{row.path}"
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        column = index.column()
+        if column == 0:
+            return os.path.basename(row.path)
+        current = row in self.manager.queue.downloads
+        if column == 1:
+            if not current:
+                return format_bytes(row.size)
+            if row.total > 0:
+                return f"{format_bytes(row.received)} of {format_bytes(row.total)} ({row.received * 100 // row.total}%)"
+            return format_bytes(row.received)
+        if column == 2:
+            return f"{format_bytes(row.rate)}/s" if current and row.rate else ""
+        if column == 3:
+            return format_eta(row.eta) if current else ""
+        if current and row.error:
+            return f"{row.state}: {row.error}"
+        return row.state
+
+    def refresh(self):
+        rows = self.manager.queue.downloads[::-1] + self.past
+        if len(rows) != len(self.rows) or any(a is not b for a, b in zip(rows, self.rows)):
+            self.beginResetModel()
+            self.rows = rows
+            self.endResetModel()
+        elif rows:
+            # Same downloads as before: only their progress changed
+            self.dataChanged.emit(self.index(0, 0), self.index(len(rows) - 1, len(self.COLUMNS) - 1))
+
+    def clear_past(self):
+        self.past = []
+        self.refresh()
+
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile=None, session_state=None):
         super(MainWindow, self).__init__()
         self.setWindowTitle("Sbrows")
         self.setGeometry(100, 100, 1200, 800)
-        self.showMaximized()
         self.setStyleSheet('font-size: 15px;')
         self.setWindowIcon(QtGui.QIcon('icon.png'))
 
-        self.profile = CustomWebEngineProfile()
-
-        self.profile.downloadRequested.connect(self.handle_download)
-
-
-        self.history = []
-        self.load_history()
-
-        self.completer = QCompleter(read_text_file_lines('links.txt'))
+        # Every window shares one profile, history store, completion index and blocklist
+        self.state = shared_state()
+        self.profile = profile if profile is not None else self.state.profile
+        self.history = self.state.history
+        self.state.site_settings_changed.connect(self.on_site_settings_changed)
+        self.state.completion_index_ready.connect(self.on_completion_index_ready)
+
+        # The index does the matching and ranking, the completer only shows its results.
+        # Reading the history into it is deferred so it doesn't hold up the first paint.
+        self.completion_model = CompletionModel(self.state, self)
+        self.completer = QCompleter(self.completion_model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
         self.completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
 
         self.tabs = QTabWidget()
@@ -168,14 +1542,33 @@ class MainWindow(QMainWindow):
         self.new_tab_button.setText('+')
         self.new_tab_button.setStyleSheet('font-size: 25px; font-weight:bold;')
         self.new_tab_button.setToolTip('Open New Tab')
-        self.new_tab_button.clicked.connect(lambda: self.add_new_tab(QUrl("https://google.com"), "New Tab"))
+        self.new_tab_button.clicked.connect(lambda: self.add_new_tab(QUrl(HOME_URL), "New Tab"))
         self.tabs.setCornerWidget(self.new_tab_button, Qt.Corner.TopRightCorner)
 
         self.tabs.setDocumentMode(True)
         self.tabs.setTabsClosable(True)
         self.tabs.tabCloseRequested.connect(self.close_current_tab)
+        # Placeholder tabs get their web view the first time they are shown
+        self.restoring = False
+        self.tabs.currentChanged.connect(self.materialize_tab)
         self.tabs.currentChanged.connect(self.update_url_bar)
         self.tabs.setMovable(True)
+        self.tabs.tabBar().setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.tabs.tabBar().customContextMenuRequested.connect(self.show_tab_context_menu)
+        self.tab_lifecycle = TabLifecycleManager(self.tabs, self)
+        self.tab_updates = TabUpdateScheduler(self)
+        self.tab_metrics = TabMetricsModel(self.tabs, self)
+        self.sidebar = None  # docks are built on first use
+        self.task_manager = None
+        self.downloads_panel = None
+
+        # Optional stream of per-tab metrics for offline analysis
+        self.metrics_log = metrics_log_from_environment()
+        if self.metrics_log is not None:
+            self.metrics_log_timer = QTimer(self)
+            self.metrics_log_timer.timeout.connect(
+                lambda: self.metrics_log.write(self.tab_metrics.snapshot()))
+            self.metrics_log_timer.start(METRICS_LOG_INTERVAL_MS)
         self.tabs.setStyleSheet(
             'QTabBar::tab { padding: 5px 5px;min-width:100px; max-width:280px; margin: 1px 5px; text-align: left; border-radius: 5px; height: 20px; font-size: 15px; }'
             'QTabBar::tab:!selected {border:1px solid #6d6d6e;}'
@@ -186,18 +1579,65 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.tabs)
 
         self.init_ui()
-        self.add_new_tab(QUrl("https://google.com"), "New Tab")
+
+        self.session = get_session()
+        if session_state:
+            self.restore_session(session_state)
+        else:
+            self.add_new_tab(QUrl(HOME_URL), "New Tab")
+        self.session.register(self)
+        self.tabs.currentChanged.connect(self.session.schedule_save)
+        self.tabs.tabBar().tabMoved.connect(self.session.schedule_save)
+
+        QTimer.singleShot(COMPLETION_INDEX_DELAY_MS, self.ensure_completion_index)
+        startup_timeline.mark('window_constructed')
+
+    def ensure_completion_index(self):
+        return self.state.ensure_completion_index()
 
     def create_new_tab_from_page(self):
-        """Create a new tab from the current page."""
-        current_browser = self.current_browser()
-        if current_browser:
-            new_tab = BrowserTab(self)
-            new_tab.browser.setPage(current_browser.page())
-            new_tab.browser.setUrl(current_browser.url())
-            self.add_new_tab(new_tab.browser.url(), "New Tab")
-            return new_tab.browser
-        return None
+        """Open a tab for a page that asked for a new window and hand Qt its page."""
+        new_tab = self.add_new_tab(QUrl(), "New Tab")
+        return new_tab.page
+
+    def restore_session(self, state):
+        """Recreate saved tabs as placeholders; only the active one is loaded."""
+        tabs = state.get('tabs', [])
+        self.restoring = True
+        for tab_state in tabs:
+            title = tab_state.get('title') or "New Tab"
+            tab = self.add_new_tab(QUrl(tab_state.get('url', '')), title, background=True,
+                                   history_state=tab_state.get('history'))
+            tab.pinned = bool(tab_state.get('pinned'))
+            self.update_tab_title(title, tab)
+        self.restoring = False
+
+        current = min(max(int(state.get('current', 0)), 0), len(tabs) - 1)
+        self.tabs.setCurrentIndex(current)
+        self.materialize_tab(current)
+        self.update_url_bar()
+
+    def materialize_tab(self, index):
+        if self.restoring:
+            return
+        tab = self.tabs.widget(index)
+        if isinstance(tab, BrowserTab):
+            tab.materialize()
+
+    def session_state(self):
+        tabs = [self.tabs.widget(index) for index in range(self.tabs.count())]
+        return {
+            'current': self.tabs.currentIndex(),
+            'tabs': [tab.session_state() for tab in tabs if isinstance(tab, BrowserTab)],
+        }
+
+    def closeEvent(self, event):
+        self.session.window_closed(self)
+        for position in range(self.tabs.count()):
+            tab = self.tabs.widget(position)
+            if isinstance(tab, BrowserTab):
+                self.track_tab_url(tab, QUrl())
+        super().closeEvent(event)
 
     def init_ui(self):
         navbar = QToolBar()
@@ -228,7 +1668,7 @@ class MainWindow(QMainWindow):
 
         home_btn = QAction('🏠︎', self)
         home_btn.setIcon(QIcon.fromTheme("go-home"))
-        home_btn.triggered.connect(lambda: self.current_browser().setUrl(QUrl("https://google.com")))
+        home_btn.triggered.connect(lambda: self.current_browser().setUrl(QUrl(HOME_URL)))
         home_btn.setToolTip('Go Home')
         home_btn.setShortcut('Ctrl+H')
         navbar.addAction(home_btn)
@@ -238,12 +1678,21 @@ class MainWindow(QMainWindow):
         self.url_bar.setStyleSheet('margin:5px;')
         navbar.addWidget(self.url_bar)
         self.url_bar.setCompleter(self.completer)
+        self.url_bar.textEdited.connect(self.update_completions)
         self.url_bar.setPlaceholderText("Enter URL or search...")
         self.url_bar.setClearButtonEnabled(True)
         self.url_bar.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
         self.url_bar.setContextMenuPolicy(Qt.ContextMenuPolicy.NoContextMenu)  # Disable context menu
         self.url_bar.setStyleSheet('QLineEdit {font-size:15px; border: 1px solid #6d6d6e; border-radius: 5px; padding: 5px; margin: 3px; }')
 
+        # Lite mode toggle for the site in the URL bar
+        self.lite_action = QAction('🪶', self)
+        self.lite_action.setCheckable(True)
+        self.lite_action.setShortcut('Ctrl+Shift+L')
+        self.lite_action.setToolTip('Lite mode for this site')
+        self.lite_action.triggered.connect(self.toggle_lite_mode)
+        navbar.addAction(self.lite_action)
+
 
          # Create a button to toggle the side panel
         toggle_sidebar_btn = QAction('☰', self)  # Hamburger button
@@ -251,9 +1700,27 @@ class MainWindow(QMainWindow):
         toggle_sidebar_btn.setShortcut('Ctrl+B')
         toggle_sidebar_btn.setToolTip('History and more')
         navbar.addAction(toggle_sidebar_btn)
+        # The sidebar itself is built the first time it is opened
+
+        task_manager_action = QAction('Task Manager', self)
+        task_manager_action.setShortcut('Shift+Esc')
+        task_manager_action.triggered.connect(self.toggle_task_manager)
+        self.addAction(task_manager_action)
+
+        downloads_action = QAction('Downloads', self)
+        downloads_action.setShortcut('Ctrl+J')
+        downloads_action.triggered.connect(self.toggle_downloads)
+        self.addAction(downloads_action)
 
-        # Create a side panel with buttons
-        self.create_sidebar()
+        tracing_action = QAction('Tracing', self)
+        tracing_action.setShortcut('Ctrl+Alt+T')
+        tracing_action.triggered.connect(self.toggle_tracing)
+        self.addAction(tracing_action)
+
+        profiling_action = QAction('Profile GUI Thread', self)
+        profiling_action.setShortcut('Ctrl+Alt+P')
+        profiling_action.triggered.connect(self.toggle_profiling)
+        self.addAction(profiling_action)
 
     def create_sidebar(self):
         self.sidebar = QDockWidget("Sidebar", self)
@@ -267,20 +1734,29 @@ class MainWindow(QMainWindow):
         tab_group = QGroupBox("Tab Management")
         tab_layout = QVBoxLayout()
         new_tab_btn = QPushButton("New Tab")
-        new_tab_btn.clicked.connect(lambda: self.add_new_tab(QUrl("https://google.com"), "New Tab"))
+        new_tab_btn.clicked.connect(lambda: self.add_new_tab(QUrl(HOME_URL), "New Tab"))
         new_window_btn = QPushButton("New Window")
         new_window_btn.clicked.connect(self.open_new_window)
+        task_manager_btn = QPushButton("Task Manager")
+        task_manager_btn.clicked.connect(self.toggle_task_manager)
         tab_layout.addWidget(new_tab_btn)
         tab_layout.addWidget(new_window_btn)
+        tab_layout.addWidget(task_manager_btn)
+        downloads_btn = QPushButton("Downloads")
+        downloads_btn.clicked.connect(self.toggle_downloads)
+        tab_layout.addWidget(downloads_btn)
         tab_group.setLayout(tab_layout)
         sidebar_layout.addWidget(tab_group)
     
         # --- Group 2: Privacy Controls ---
         privacy_group = QGroupBox("Privacy Controls")
         privacy_layout = QVBoxLayout()
-        clear_cookies_btn = QPushButton("Clear Cookies")
-        clear_cookies_btn.clicked.connect(self.clear_cookies)
-        privacy_layout.addWidget(clear_cookies_btn)
+        clear_site_cookies_btn = QPushButton("Clear Cookies for This Site")
+        clear_site_cookies_btn.clicked.connect(self.clear_site_cookies)
+        manage_cookies_btn = QPushButton("Manage Cookies")
+        manage_cookies_btn.clicked.connect(self.show_cookies)
+        privacy_layout.addWidget(clear_site_cookies_btn)
+        privacy_layout.addWidget(manage_cookies_btn)
         privacy_group.setLayout(privacy_layout)
         sidebar_layout.addWidget(privacy_group)
     
@@ -292,6 +1768,35 @@ class MainWindow(QMainWindow):
         history_layout.addWidget(show_history_btn)
         history_group.setLayout(history_layout)
         sidebar_layout.addWidget(history_group)
+
+        # --- Group 4: Blocked Requests ---
+        blocked_group = QGroupBox("Blocked Requests")
+        blocked_layout = QVBoxLayout()
+        self.blocked_total_label = QLabel()
+        self.blocked_total_label.setWordWrap(True)
+        self.blocked_list = QListWidget()
+        blocked_layout.addWidget(self.blocked_total_label)
+        blocked_layout.addWidget(self.blocked_list)
+        blocked_group.setLayout(blocked_layout)
+        sidebar_layout.addWidget(blocked_group)
+
+        # --- Group 5: Diagnostics ---
+        diagnostics_group = QGroupBox("Diagnostics")
+        diagnostics_layout = QVBoxLayout()
+        self.tracing_btn = QPushButton()
+        self.tracing_btn.clicked.connect(self.toggle_tracing)
+        self.profiling_btn = QPushButton()
+        self.profiling_btn.clicked.connect(self.toggle_profiling)
+        diagnostics_layout.addWidget(self.tracing_btn)
+        diagnostics_layout.addWidget(self.profiling_btn)
+        diagnostics_group.setLayout(diagnostics_layout)
+        sidebar_layout.addWidget(diagnostics_group)
+        self.update_diagnostics_buttons()
+
+        # Only poll the counters while the panel can be seen
+        self.blocked_panel_timer = QTimer(self)
+        self.blocked_panel_timer.timeout.connect(self.update_blocked_panel)
+        self.sidebar.visibilityChanged.connect(self.on_sidebar_visibility_changed)
     
         # --- Misc ---
         close_btn = QPushButton("Close Browser")
@@ -305,79 +1810,313 @@ class MainWindow(QMainWindow):
         self.sidebar.setFixedWidth(220)
     def toggle_sidebar(self):
         """Toggle the sidebar visibility."""
+        if self.sidebar is None:
+            self.create_sidebar()
         self.sidebar.setVisible(not self.sidebar.isVisible())
 
-    def handle_download(self, download: QWebEngineDownloadRequest):
-        save_path, _ = QFileDialog.getSaveFileName(self, "Save File", download.downloadFileName())
-        if not save_path:
-            download.cancel()
-            return
-
-        download.setDownloadFileName(os.path.basename(save_path))
-        download.setPath(save_path)
-        download.accept()
-
-        # Progress Dialog
-        progress_dialog = QProgressDialog(f"Downloading {download.downloadFileName()}...", "Cancel", 0, 100, self)
-        progress_dialog.setWindowTitle("Download Progress")
-        progress_dialog.setWindowModality(Qt.WindowModality.ApplicationModal)
-        progress_dialog.setAutoClose(True)
-        progress_dialog.show()
-
-        def update_progress(received, total):
-            if total > 0:
-                percent = int((received / total) * 100)
-                progress_dialog.setValue(percent)
-                progress_dialog.setLabelText(
-                    f"{download.downloadFileName()}: {received // 1024} KB of {total // 1024} KB"
-                )
-
-        def on_finished():
-            progress_dialog.close()
-            QMessageBox.information(self, "Download Finished", f"File saved to:\n{save_path}")
-
-        def on_cancel():
-            download.cancel()
-            progress_dialog.close()
-
-        download.downloadProgress.connect(update_progress)
-        download.finished.connect(on_finished)
-        progress_dialog.canceled.connect(on_cancel)
-
+    def on_sidebar_visibility_changed(self, visible):
+        if visible:
+            self.update_blocked_panel()
+            self.update_diagnostics_buttons()  # tracing may have been toggled from another window
+            self.blocked_panel_timer.start(BLOCKED_PANEL_REFRESH_MS)
+        else:
+            self.blocked_panel_timer.stop()
+
+    def toggle_task_manager(self):
+        if self.task_manager is None:
+            self.create_task_manager()
+        self.task_manager.setVisible(not self.task_manager.isVisible())
+
+    def create_task_manager(self):
+        """Dock with a sortable table of every tab's metrics, refreshed while it is shown."""
+        self.task_manager = QDockWidget("Task Manager", self)
+        proxy = QSortFilterProxyModel(self.task_manager)
+        proxy.setSourceModel(self.tab_metrics)
+        proxy.setSortRole(TabMetricsModel.SORT_ROLE)
+
+        view = QTableView()
+        view.setModel(proxy)
+        view.setSortingEnabled(True)
+        view.sortByColumn(TabMetricsModel.COLUMNS.index(('renderer_rss', "Memory (MB)")), Qt.SortOrder.DescendingOrder)
+        view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        view.verticalHeader().setVisible(False)
+        view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        view.doubleClicked.connect(
+            lambda index: self.tabs.setCurrentIndex(self.tab_metrics.rows[proxy.mapToSource(index).row()]['index']))
+        self.ui_updates_label = QLabel()
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        layout.addWidget(self.ui_updates_label)
+        layout.addWidget(view)
+        self.task_manager.setWidget(panel)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.task_manager)
+        self.task_manager.setVisible(False)
+
+        self.task_manager_timer = QTimer(self)
+        self.task_manager_timer.timeout.connect(self.refresh_task_manager)
+        self.task_manager.visibilityChanged.connect(self.on_task_manager_visibility_changed)
+
+    def on_task_manager_visibility_changed(self, visible):
+        if visible:
+            self.refresh_task_manager()
+            self.task_manager_timer.start(TASK_MANAGER_REFRESH_MS)
+        else:
+            self.task_manager_timer.stop()
+
+    def refresh_task_manager(self):
+        self.tab_metrics.refresh()
+        self.ui_updates_label.setText(self.tab_updates.summary())
+
+    def update_blocked_panel(self):
+        """Refresh the blocked request counts shown in the sidebar."""
+        stats = self.profile.interceptor.stats
+        lite = self.state.lite
+        self.blocked_total_label.setText(
+            f"{stats.total} blocked, ~{stats.bytes_saved // 1024} KB saved\n"
+            f"Lite mode: {lite.requests} skipped, ~{lite.bytes // 1024} KB saved")
+
+        self.blocked_list.clear()
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index)
+            page = tab.page if isinstance(tab, BrowserTab) else None
+            blocked, saved = (page.request_stats.blocked, page.request_stats.bytes_saved) if page else (0, 0)
+            self.blocked_list.addItem(f"{self.tabs.tabText(index)}: {blocked} blocked, ~{saved // 1024} KB")
+
+    def toggle_tracing(self):
+        """Start recording spans, or stop and write them to trace_python.json."""
+        if tracer.enabled:
+            tracer.stop()
+        else:
+            tracer.start()
+        self.update_diagnostics_buttons()
+
+    def toggle_profiling(self):
+        """Start profiling the GUI thread, or stop and save the profile."""
+        if gui_profiler.running:
+            path = gui_profiler.stop()
+            if path:
+                print(f"GUI thread profile saved to {path}")
+        else:
+            gui_profiler.start()
+        self.update_diagnostics_buttons()
 
-    def clear_cookies(self):
-        """Clear all cookies."""
-        self.profile.clear_cookies()
-        print("Cookies cleared")
+    def update_diagnostics_buttons(self):
+        if self.sidebar is None:
+            return
+        self.tracing_btn.setText("Stop Tracing" if tracer.enabled else "Start Tracing")
+        self.profiling_btn.setText("Stop Profiling" if gui_profiler.running else "Profile GUI Thread")
+
+    def show_downloads(self):
+        if self.downloads_panel is None:
+            self.create_downloads_panel()
+        self.downloads_panel.setVisible(True)
+
+    def toggle_downloads(self):
+        if self.downloads_panel is None:
+            self.create_downloads_panel()
+        self.downloads_panel.setVisible(not self.downloads_panel.isVisible())
+
+    def create_downloads_panel(self):
+        """Non-modal downloads dock over the profile's download manager."""
+        manager = self.profile.downloads
+        self.downloads_panel = QDockWidget("Downloads", self)
+        self.downloads_model = DownloadsModel(manager, self.history.downloads(DOWNLOAD_HISTORY_LIMIT), self)
+
+        panel = QWidget()
+        layout = QVBoxLayout(panel)
+        controls = QHBoxLayout()
+        self.downloads_summary = QLabel(manager.summary())
+        controls.addWidget(self.downloads_summary, 1)
+        controls.addWidget(QLabel("At once:"))
+        max_active = QSpinBox()
+        max_active.setRange(1, 16)
+        max_active.setValue(manager.queue.max_active)
+        max_active.valueChanged.connect(manager.set_max_active)
+        controls.addWidget(max_active)
+
+        view = QTableView()
+        view.setModel(self.downloads_model)
+        view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        view.verticalHeader().setVisible(False)
+        view.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        view.doubleClicked.connect(
+            lambda index: self.open_download(self.downloads_model.rows[index.row()]))
+
+        def selected():
+            rows = {index.row() for index in view.selectionModel().selectedRows()}
+            queue = manager.queue.downloads
+            return [self.downloads_model.rows[row] for row in sorted(rows) if self.downloads_model.rows[row] in queue]
+
+        def clear_finished():
+            manager.clear_finished()
+            self.downloads_model.clear_past()
+
+        for label, action in (("Pause", lambda: manager.pause(selected())),
+                              ("Resume", lambda: manager.resume(selected())),
+                              ("Cancel", lambda: manager.cancel(selected())),
+                              ("Clear Finished", clear_finished)):
+            button = QPushButton(label)
+            button.clicked.connect(action)
+            controls.addWidget(button)
+
+        layout.addLayout(controls)
+        layout.addWidget(view)
+        self.downloads_panel.setWidget(panel)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.downloads_panel)
+        self.downloads_panel.setVisible(False)
+
+        # Progress arrives already coalesced by the manager; hidden panels skip even that
+        manager.changed.connect(self.update_downloads_panel)
+        self.downloads_panel.visibilityChanged.connect(lambda visible: visible and self.update_downloads_panel())
+
+    def update_downloads_panel(self):
+        if not self.downloads_panel.isVisible():
+            return
+        self.downloads_model.refresh()
+        self.downloads_summary.setText(self.profile.downloads.summary())
+
+    def open_download(self, download):
+        if download.state == COMPLETED and os.path.exists(download.path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(download.path))
+
+    def clear_site_cookies(self):
+        """Delete the cookies of the current tab's site and its subdomains."""
+        tab = self.tabs.currentWidget()
+        host = tab.url().host() if isinstance(tab, BrowserTab) else ''
+        if not host:
+            return
+        site = host[4:] if host.startswith('www.') else host
+        deleted = self.profile.cookies.delete_domain(site)
+        QMessageBox.information(self, 'Cookies Cleared', f"Deleted {deleted} cookies of {site}.")
+
+    def show_cookies(self):
+        """Cookies by domain, with per-domain deletion and bulk import/export."""
+        manager = self.profile.cookies
+        dialog = QDialog(self)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.setWindowTitle("Cookies")
+        dialog.resize(520, 600)
+        layout = QVBoxLayout(dialog)
+
+        search = QLineEdit(dialog)
+        search.setPlaceholderText("Filter domains...")
+        search.setClearButtonEnabled(True)
+        summary = QLabel(dialog)
+        domain_list = QListWidget(dialog)
+        domain_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        layout.addWidget(search)
+        layout.addWidget(summary)
+        layout.addWidget(domain_list)
+
+        def refresh():
+            text = search.text().strip().lower()
+            domains = manager.index.domains()
+            domain_list.clear()
+            for domain, count in domains:
+                if text in domain:
+                    item = QListWidgetItem(f"{domain} ({count})")
+                    item.setData(Qt.ItemDataRole.UserRole, domain)
+                    domain_list.addItem(item)
+            summary.setText(f"{len(manager.index)} cookies from {len(domains)} domains")
+
+        def selected_domains():
+            return [item.data(Qt.ItemDataRole.UserRole) for item in domain_list.selectedItems()]
+
+        def delete_selected():
+            domains = selected_domains()
+            if domains:
+                for domain in domains:
+                    manager.delete_domain(domain, include_subdomains=False)
+
+        def delete_all():
+            response = QMessageBox.question(dialog, 'Delete All Cookies',
+                                            "Are you sure you want to delete every cookie?",
+                                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if response == QMessageBox.StandardButton.Yes:
+                manager.delete_all()
+
+        def import_cookies():
+            path, _ = QFileDialog.getOpenFileName(dialog, "Import Cookies", "",
+                                                  "Cookie files (*.txt *.json);;All files (*)")
+            if path:
+                try:
+                    count = manager.import_file(path)
+                except (OSError, ValueError) as e:
+                    QMessageBox.warning(dialog, 'Import Failed', f"Could not read {path}:\n{e}")
+                    return
+                QMessageBox.information(dialog, 'Cookies Imported', f"Imported {count} cookies.")
+
+        def export_cookies():
+            path, _ = QFileDialog.getSaveFileName(dialog, "Export Cookies", "cookies.txt",
+                                                  "Netscape cookies.txt (*.txt);;JSON (*.json)")
+            if path:
+                try:
+                    count = manager.export_file(path, selected_domains() or None)
+                except OSError as e:
+                    QMessageBox.warning(dialog, 'Export Failed', f"Could not write {path}:\n{e}")
+                    return
+                QMessageBox.information(dialog, 'Cookies Exported', f"Exported {count} cookies to {path}.")
+
+        buttons = QHBoxLayout()
+        for label, action in (("Delete Selected", delete_selected), ("Delete All", delete_all),
+                              ("Import...", import_cookies), ("Export...", export_cookies)):
+            button = QPushButton(label, dialog)
+            button.clicked.connect(action)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+
+        search.textChanged.connect(refresh)
+        manager.changed.connect(refresh)
+        dialog.finished.connect(lambda: manager.changed.disconnect(refresh))
+        refresh()
+        dialog.exec()
 
     def show_history(self):
         """Show the browsing history in a dialog with delete and clear options."""
         history_window = QDialog(self)
+        history_window.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
         history_window.setWindowTitle("History")
+        history_window.resize(800, 600)
         history_layout = QVBoxLayout()
 
-        # Create a QListWidget to display history items
-        history_list = QListWidget()
-
-        # Add history URLs to the list
-        for entry in self.history:
-            item = QListWidgetItem(entry)
-            history_list.addItem(item)
-
-        # Create the "Delete" button to delete selected history item
+        search_bar = QLineEdit()
+        search_bar.setPlaceholderText("Search history...")
+        search_bar.setClearButtonEnabled(True)
+        history_layout.addWidget(search_bar)
+
+        # Rows are paged in from the store as the list scrolls, never all at once
+        history_model = HistoryModel(self.history, history_window)
+        self.state.history_deleted.connect(history_model.remove_urls)
+        self.state.history_cleared.connect(history_model.clear)
+        history_window.finished.connect(lambda: (self.state.history_deleted.disconnect(history_model.remove_urls),
+                                                 self.state.history_cleared.disconnect(history_model.clear)))
+        history_list = QListView()
+        history_list.setModel(history_model)
+        history_list.setUniformItemSizes(True)
+        history_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        history_model.fetchMore()
+
+        # Search once typing pauses rather than on every keystroke
+        search_timer = QTimer(history_window)
+        search_timer.setSingleShot(True)
+        search_timer.setInterval(HISTORY_SEARCH_DELAY_MS)
+        search_timer.timeout.connect(lambda: history_model.set_filter(search_bar.text().strip()))
+        search_bar.textChanged.connect(lambda _: search_timer.start())
+
+        # Create the "Delete" button to delete selected history items
         def delete_selected_history():
-            selected_item = history_list.selectedItems()
-            if selected_item:
-                item = selected_item[0]
-                history_url = item.text()
+            urls = [index.data(Qt.ItemDataRole.UserRole) for index in history_list.selectionModel().selectedRows()]
+            urls = [url for url in urls if url]
+            if urls:
+                target = f"'{urls[0]}'" if len(urls) == 1 else f"{len(urls)} entries"
                 response = QMessageBox.question(self, 'Confirm Deletion', 
-                                                f"Are you sure you want to delete '{history_url}' from history?", 
+                                                f"Are you sure you want to delete {target} from history?", 
                                                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
                 if response == QMessageBox.StandardButton.Yes:
-                    # Remove from history and update the saved file
-                    self.history.remove(history_url)
-                    self.save_history()  # Update the history file
-                    history_list.takeItem(history_list.row(item))  # Remove item from the list
+                    self.state.delete_history(urls)  # every open history list drops them
 
         # Create the "Clear History" button to clear all history
         def clear_all_history():
@@ -385,10 +2124,8 @@ class MainWindow(QMainWindow):
                                             "Are you sure you want to clear all browsing history?", 
                                             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if response == QMessageBox.StandardButton.Yes:
-                # Clear history and update the saved file
-                self.history.clear()
-                self.save_history()  # Clear history in the file
-                history_list.clear()  # Clear all items from the list
+                # Clear history; the store writes it out in the background
+                self.state.clear_history()
                 QMessageBox.information(self, 'History Cleared', 'All browsing history has been cleared.')
 
         # Add the "Delete" and "Clear All" buttons
@@ -403,58 +2140,99 @@ class MainWindow(QMainWindow):
 
         history_window.setLayout(history_layout)
         history_window.exec()
-    def add_new_tab(self, qurl=None, label="New Tab"):
+
+    @traced(category='tabs')
+    def add_new_tab(self, qurl=None, label="New Tab", background=False, history_state=None):
         if qurl is None:
-            qurl = QUrl("https://google.com")
+            qurl = QUrl(HOME_URL)
 
-        new_tab = BrowserTab(self)
-        new_tab.browser.setUrl(qurl)
+        new_tab = BrowserTab(self, qurl, label, history_state)
         i = self.tabs.addTab(new_tab, label)
-        self.tabs.setCurrentIndex(i)
-
-        #loading_icon = QtGui.QIcon("loading.gif")
-        loading_icon = QIcon.fromTheme("view-refresh")
-        self.tabs.setTabIcon(i, loading_icon)
+        self.session_changed()
+        if background:
+            return new_tab  # stays a placeholder until first shown
 
-        new_tab.browser.loadStarted.connect(lambda: self.tabs.setTabIcon(self.tabs.indexOf(new_tab), QtGui.QIcon("loading.gif")))
-        new_tab.browser.iconChanged.connect(
-            lambda icon, tab=new_tab: self.set_tab_icon(icon, self.tabs.indexOf(tab)))
-        new_tab.browser.urlChanged.connect(lambda q, b=new_tab.browser: self.update_url_bar(q))
-        new_tab.browser.titleChanged.connect(lambda title, tab=new_tab: self.update_tab_title(title, tab))
-        new_tab.browser.loadProgress.connect(lambda progress, tab=new_tab: self.update_tab_title(f"{progress}% - loading...", tab))
-        new_tab.browser.loadFinished.connect(lambda ok, tab=new_tab: self.update_url_bar(tab.browser.url()))
-        new_tab.browser.loadFinished.connect(lambda ok, tab=new_tab: self.update_tab_title(tab.browser.title(), tab))
-
-        # Update history on new page load
-        self.update_history(qurl)
+        new_tab.materialize()
+        self.tabs.setCurrentIndex(i)
+        return new_tab
+
+    def on_load_progress(self, tab, progress):
+        tab.load_progress = progress
+        self.tab_updates.request(tab, TabUpdateScheduler.TEXT)
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.Type.WindowStateChange and not self.isMinimized():
+            self.tab_updates.resume()
+        super().changeEvent(event)
+
+    def session_changed(self):
+        # Tabs are added while the window is built, before the session is attached
+        if hasattr(self, 'session'):
+            self.session.schedule_save()
+
+    def connect_tab(self, new_tab):
+        """Wire a tab's freshly created web view to the window."""
+        new_tab.browser.loadStarted.connect(new_tab.metrics.navigation_started)
+        new_tab.browser.loadFinished.connect(new_tab.metrics.load_finished)
+
+        # Tab bar and URL bar updates are only requested here and applied once per frame
+        updates = self.tab_updates
+        new_tab.browser.loadStarted.connect(lambda tab=new_tab: updates.request(tab, updates.TEXT, updates.ICON))
+        new_tab.browser.loadProgress.connect(lambda progress, tab=new_tab: self.on_load_progress(tab, progress))
+        new_tab.browser.loadFinished.connect(
+            lambda ok, tab=new_tab: updates.request(tab, updates.TEXT, updates.ICON, updates.URL))
+        new_tab.browser.titleChanged.connect(lambda title, tab=new_tab: updates.request(tab, updates.TEXT))
+        new_tab.browser.iconChanged.connect(lambda icon, tab=new_tab: updates.request(tab, updates.ICON))
+        new_tab.browser.urlChanged.connect(lambda q, tab=new_tab: updates.request(tab, updates.URL))
+        new_tab.browser.urlChanged.connect(lambda q, tab=new_tab: self.track_tab_url(tab, q))
+
+        # Record visits once pages have actually loaded, including link clicks
+        new_tab.browser.loadFinished.connect(
+            lambda ok, tab=new_tab: ok and self.update_history(tab.browser.url(), tab.browser.title()))
+        new_tab.browser.titleChanged.connect(
+            lambda title, tab=new_tab: self.update_history_title(tab.browser.url(), title))
+        new_tab.browser.urlChanged.connect(self.session_changed)
 
     def open_new_window(self):
-        new_window = MainWindow()
-        new_window.show()
+        new_window = MainWindow(self.profile)
+        new_window.showMaximized()
 
         # Store reference to avoid being garbage collected
         if not hasattr(self, 'child_windows'):
             self.child_windows = []
         self.child_windows.append(new_window)
 
-    def update_history(self, url):
-        """Update the browsing history."""
-        if url not in self.history:
-            self.history.insert(0, url.toString()) 
-            if len(self.history) > 50:
-                self.history.pop(0)
-        self.save_history()
-
-    def save_history(self):
-        """Save the browsing history to a file."""
-        with open('history.json', 'w') as file:
-            json.dump(self.history, file)
-
-    def load_history(self):
-        """Load the browsing history from a file."""
-        if os.path.exists('history.json'):
-            with open('history.json', 'r') as file:
-                self.history = json.load(file)
+    @traced(category='history')
+    def update_history(self, url, title=''):
+        if url.scheme() != SNAPSHOT_SCHEME:  # the live page is recorded when it replaces the snapshot
+            self.state.record_visit(url.toString(), title)
+
+    def update_history_title(self, url, title):
+        if url.scheme() != SNAPSHOT_SCHEME:
+            self.state.set_title(url.toString(), title)
+
+    def track_tab_url(self, tab, qurl):
+        """Keep the completion index's open-tab bonus in step with a tab's URL."""
+        qurl = live_url(qurl, self.profile)
+        url = qurl.toString() if qurl.scheme() in ('http', 'https', 'file') else ''
+        if url == tab.indexed_url:
+            return
+        self.state.tab_url_changed(tab.indexed_url, url)
+        tab.indexed_url = url
+
+    def on_completion_index_ready(self):
+        # Show what was typed while the index was being built
+        if self.url_bar.hasFocus() and self.url_bar.text().strip():
+            self.update_completions(self.url_bar.text())
+
+    def update_completions(self, text):
+        """Re-query the completion index as the user types in the URL bar."""
+        self.ensure_completion_index()
+        self.completion_model.update_results(text)
+        if self.completion_model.rowCount():
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
 
     def navigate_to_url(self):
         url = self.url_bar.text().strip()
@@ -464,9 +2242,9 @@ class MainWindow(QMainWindow):
             else:
                 url = f"https://www.google.com/search?q={QUrl.toPercentEncoding(url).data().decode()}"
         self.current_browser().setUrl(QUrl(url))
-        self.update_history(QUrl(url))
         
 
+    @traced(category='ui')
     def update_url_bar(self, qurl=None):
         # Ensure qurl is a valid QUrl object or convert it to one
         if isinstance(qurl, QUrl):
@@ -480,22 +2258,50 @@ class MainWindow(QMainWindow):
                 url = browser.url()
             else:
                 url = QUrl()
-
-        # Update the URL bar text
-        self.url_bar.setText(url.toString())
-
-        # Remove old icon action if any
-        if hasattr(self, 'lock_action'):
-            self.url_bar.removeAction(self.lock_action)
-
-        # Choose icon and color based on the scheme
-        if url.scheme() == "https":
-            icon = QIcon('img/locked.png') 
+        url = live_url(url, self.profile)  # the bar shows the page a snapshot stands for
+
+        # Nothing to do if the bar already shows this URL
+        text = url.toString()
+        secure = url.scheme() == "https"
+        if text == self.url_bar.text() and secure == getattr(self, 'url_bar_secure', None):
+            return False
+        self.url_bar.setText(text)
+
+        # One lock icon action, created once and only re-iconed when the scheme changes
+        if secure != getattr(self, 'url_bar_secure', None):
+            icon = cached_icon('img/locked.png' if secure else 'img/unlocked.png')
+            if hasattr(self, 'lock_action'):
+                self.lock_action.setIcon(icon)
+            else:
+                self.lock_action = self.url_bar.addAction(icon, QLineEdit.ActionPosition.LeadingPosition)
+            self.url_bar_secure = secure
+        self.update_lite_action(url)
+        return True
+
+    def on_site_settings_changed(self, host):
+        browser = self.current_browser()
+        if browser is not None:
+            self.update_lite_action(browser.url())
+
+    def update_lite_action(self, url):
+        lite = self.state.lite
+        host = url.host()
+        enabled = bool(host) and lite.enabled_for(host)
+        self.lite_action.setChecked(enabled)
+        self.lite_action.setEnabled(bool(host))
+        if enabled:
+            skipped, saved = lite.site_stats(host)
+            self.lite_action.setToolTip(f"Lite mode on for {host}: {skipped} requests skipped, ~{saved // 1024} KB saved")
         else:
-            icon = QIcon('img/unlocked.png')
+            self.lite_action.setToolTip("Lite mode for this site")
 
-        # Add icon to the left side of the URL bar
-        self.lock_action = self.url_bar.addAction(icon, QLineEdit.ActionPosition.LeadingPosition)
+    def toggle_lite_mode(self):
+        """Turn lite mode on or off for the current site, and reload it to apply."""
+        browser = self.current_browser()
+        if browser is None or not browser.url().host():
+            return
+        self.state.toggle_lite_mode(browser.url().host())  # every window's button follows
+        browser.reload()
     
     
     
@@ -504,31 +2310,78 @@ class MainWindow(QMainWindow):
         return current_widget.browser if current_widget else None
 
     def update_tab_title(self, title, tab):
+        """Set a tab's text; returns whether it changed."""
         index = self.tabs.indexOf(tab)
-        if index >= 0:
-            self.tabs.setTabText(index, title)
-
-    def set_tab_icon(self, icon, index):
-        self.tabs.setTabIcon(index, icon)
+        text = f"📌 {title}" if tab.pinned else title
+        if index < 0 or self.tabs.tabText(index) == text:
+            return False
+        self.tabs.setTabText(index, text)
+        return True
+
+    def show_tab_context_menu(self, pos):
+        index = self.tabs.tabBar().tabAt(pos)
+        tab = self.tabs.widget(index)
+        if not isinstance(tab, BrowserTab):
+            return
+        menu = QMenu(self)
+        pin_action = menu.addAction("Unpin Tab" if tab.pinned else "Pin Tab")
+        if menu.exec(self.tabs.tabBar().mapToGlobal(pos)) == pin_action:
+            # Pinned tabs are never frozen or discarded
+            tab.pinned = not tab.pinned
+            self.update_tab_title(tab.title(), tab)
 
     def close_current_tab(self, index):
         if self.tabs.count() > 1:
             tab_widget = self.tabs.widget(index)
             if isinstance(tab_widget, BrowserTab):
+                self.track_tab_url(tab_widget, QUrl())
                 browser = tab_widget.browser
-                browser.stop()  # Stop loading
-                browser.setUrl(QUrl("about:blank"))  # Navigate to blank
-                browser.page().deleteLater()  # Clean up page resources
-                browser.deleteLater()  # Clean up browser
+                if browser is not None:
+                    browser.stop()  # Stop loading
+                    browser.setUrl(QUrl("about:blank"))  # Navigate to blank
+                    browser.page().deleteLater()  # Clean up page resources
+                    browser.deleteLater()  # Clean up browser
                 tab_widget.deleteLater()  # Clean up container
             self.tabs.removeTab(index)
+            self.session_changed()
         else:
             self.close()
 
 
 
+def track_startup(app, windows):
+    """Complete the startup timeline when the first window's page has loaded."""
+    startup_timeline.mark('windows_shown')
+    QTimer.singleShot(0, lambda: startup_timeline.mark('event_loop_running'))
+    app.aboutToQuit.connect(startup_timeline.finish)
+    app.aboutToQuit.connect(lambda: tracer.enabled and tracer.stop())
+
+    browser = windows[0].current_browser()
+    if browser is None:
+        startup_timeline.finish()
+        return
+
+    def on_first_load(ok):
+        browser.loadFinished.disconnect(on_first_load)
+        startup_timeline.mark('first_load_finished' if ok else 'first_load_failed')
+        startup_timeline.finish()
+
+    browser.loadFinished.connect(on_first_load)
+
+
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['batch']:
+        # Headless snapshots of a URL list (see batch.py); reuse this module rather than import it twice
+        sys.modules.setdefault('browser', sys.modules['__main__'])
+        from batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+
     app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
+    startup_timeline.mark('application_created')
+    windows = get_session().restore()
+    if not windows:
+        window = MainWindow()
+        window.showMaximized()
+        windows = [window]
+    track_startup(app, windows)
     sys.exit(app.exec())
\ No newline at end of file
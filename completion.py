@@ -0,0 +1,357 @@
+"""Omnibox completion index.
+
+Merges quick links, history and open tabs into one index that is updated
+incrementally as pages are visited.  Lookups use two sorted key lists so a
+keystroke costs a binary search plus the handful of candidates found:
+
+* the lower-cased words of every URL and title, for queries like ``git sh``
+* the URLs themselves without scheme and ``www.``, for ``github.com/sh``
+
+Results are ranked by frecency: visit count weighted by how recent the last
+visit was, with a bonus for quick links and tabs that are already open.
+Very common prefixes walk a cached frecency order of every entry instead.
+Re-sorting it is slow on a large index, so it is done in two halves the
+caller can split across threads: ``start_ranking`` on the thread that
+updates the index, ``rank_entries`` anywhere, ``finish_ranking`` back on
+the updating thread.
+"""
+import heapq
+import re
+import time
+from bisect import bisect_left, insort
+
+
+SCAN_THRESHOLD = 2000     # candidates beyond which a frecency-ordered scan is cheaper
+BULK_THRESHOLD = 64       # keys added or removed at once beyond which the lists are rebuilt
+RERANK_SECONDS = 3600     # recency buckets shift slowly, so the ranking is cached
+MAX_CHANGED = 5000        # entries updated since the last ranking before it is redone
+
+LINK_BONUS = 100
+OPEN_TAB_BONUS = 50
+
+# (maximum age in days, weight), as in Firefox's frecency buckets
+RECENCY_WEIGHTS = ((4, 100), (14, 70), (31, 50), (90, 30))
+OLD_VISIT_WEIGHT = 10
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_WORD_QUERY_RE = re.compile(r'[a-z0-9 ]+')
+_SCHEME_RE = re.compile(r'^[a-z][a-z0-9+.\-]*://(www\.)?')
+
+
+def rank_entries(entries, now):
+    """Sort entries best first; safe off the updating thread, it only reads them."""
+    return sorted(entries, key=lambda entry: entry.frecency(now), reverse=True)
+
+
+def strip_url(url):
+    """Lower-case a URL and drop the scheme and ``www.`` prefix."""
+    url = url.lower()
+    stripped = _SCHEME_RE.sub('', url)
+    if stripped == url and url.startswith('www.'):
+        stripped = url[4:]
+    return stripped
+
+
+class CompletionEntry:
+    __slots__ = ('id', 'url', 'key', 'title', 'words', 'visit_count', 'last_visit', 'is_link', 'open_tabs')
+
+    def __init__(self, entry_id, url):
+        self.id = entry_id
+        self.url = url
+        self.key = strip_url(url)
+        self.title = ''
+        self.words = ()
+        self.visit_count = 0
+        self.last_visit = 0.0
+        self.is_link = False
+        self.open_tabs = 0
+
+    def frecency(self, now):
+        score = 0
+        if self.visit_count:
+            age_days = (now - self.last_visit) / 86400
+            weight = OLD_VISIT_WEIGHT
+            for max_age, bucket_weight in RECENCY_WEIGHTS:
+                if age_days <= max_age:
+                    weight = bucket_weight
+                    break
+            score += self.visit_count * weight
+        if self.is_link:
+            score += LINK_BONUS
+        if self.open_tabs:
+            score += OPEN_TAB_BONUS
+        return score
+
+    def matches(self, terms):
+        """Every term must be the prefix of a word of the URL or title."""
+        words = self.words
+        for term in terms:
+            for word in words:
+                if word.startswith(term):
+                    break
+            else:
+                return False
+        return True
+
+
+class CompletionIndex:
+    """Incremental prefix index over URLs and titles, ranked by frecency."""
+
+    def __init__(self):
+        self.entries = {}
+        self.by_url = {}
+        self.postings = {}       # word -> set of entry ids
+        self.words = []          # sorted distinct words
+        self.url_keys = []       # sorted (stripped url, entry id)
+        self._new_words = []     # added since the key lists were last sorted
+        self._new_url_keys = []
+        self._next_id = 0
+        self._ranked = None
+        self._ranked_at = 0.0
+        self._changed = set()    # ids whose frecency moved since the ranking was made
+        self._ranking_changed = None  # the same, since a re-ranking in progress was started
+
+    def __len__(self):
+        return len(self.entries)
+
+    # --- updates ---
+
+    def add_link(self, url, title=''):
+        entry = self._entry(url, title)
+        if not entry.is_link:
+            entry.is_link = True
+            self._mark_changed(entry.id)
+
+    def add_history(self, url, title='', visit_count=1, last_visit=None):
+        """Merge a history row (e.g. loaded from the history store)."""
+        entry = self._entry(url, title)
+        entry.visit_count += visit_count
+        entry.last_visit = max(entry.last_visit, last_visit or time.time())
+        if title and title != entry.title:
+            self._set_words(entry, title)
+        self._mark_changed(entry.id)
+
+    def record_visit(self, url, title=''):
+        self.add_history(url, title, 1, time.time())
+
+    def set_title(self, url, title):
+        entry = self.by_url.get(url)
+        if entry is not None and title and title != entry.title:
+            self._set_words(entry, title)
+
+    def tab_opened(self, url, title=''):
+        entry = self._entry(url, title)
+        entry.open_tabs += 1
+        self._mark_changed(entry.id)
+
+    def tab_closed(self, url):
+        entry = self.by_url.get(url)
+        if entry is not None and entry.open_tabs:
+            entry.open_tabs -= 1
+            self._mark_changed(entry.id)
+            self._forget_unused([entry])
+
+    def forget_history(self, urls):
+        """Drop the history part of entries, e.g. after they are deleted from history."""
+        entries = []
+        for url in urls:
+            entry = self.by_url.get(url)
+            if entry is not None:
+                entry.visit_count = 0
+                entry.last_visit = 0.0
+                self._mark_changed(entry.id)
+                entries.append(entry)
+        self._forget_unused(entries)
+
+    def clear_history(self):
+        self.forget_history(list(self.by_url))
+
+    # --- ranking ---
+
+    def needs_ranking(self, now=None):
+        """Whether the cached frecency order is missing, stale or too far behind the updates."""
+        now = now or time.time()
+        return (self._ranked is None or len(self._changed) > MAX_CHANGED
+                or now - self._ranked_at > RERANK_SECONDS)
+
+    def start_ranking(self):
+        """Begin a re-ranking; returns the entries for ``rank_entries`` to sort."""
+        self._ranking_changed = set()
+        return list(self.entries.values())
+
+    def finish_ranking(self, ranked, now):
+        """Install an order made by ``rank_entries`` from the entries of ``start_ranking``."""
+        self._ranked = ranked
+        self._ranked_at = now
+        self._changed = self._ranking_changed if self._ranking_changed is not None else set()
+        self._ranking_changed = None
+
+    def rerank(self):
+        now = time.time()
+        self.finish_ranking(rank_entries(self.start_ranking(), now), now)
+
+    def compact(self):
+        """Sort the keys of a bulk load now, so the first lookup doesn't pay for it."""
+        self._sort_keys()
+
+    # --- queries ---
+
+    def query(self, text, limit=10):
+        """Return up to ``limit`` entries matching ``text``, best first."""
+        text = strip_url(text.strip())
+        if not _WORD_RE.search(text):
+            return []
+        self._sort_keys()
+
+        if _WORD_QUERY_RE.fullmatch(text):
+            terms = text.split()
+            candidates = self._word_candidates(terms)
+            if candidates is None:
+                return self._scan(lambda entry: entry.matches(terms), limit)
+            matches = [entry for entry in map(self.entries.__getitem__, candidates) if entry.matches(terms)]
+        else:
+            low = bisect_left(self.url_keys, (text,))
+            high = bisect_left(self.url_keys, (text + '\uffff',))
+            if high - low > SCAN_THRESHOLD:
+                return self._scan(lambda entry: entry.key.startswith(text), limit)
+            matches = [self.entries[entry_id] for _, entry_id in self.url_keys[low:high]]
+
+        now = time.time()
+        return heapq.nlargest(limit, matches, key=lambda entry: entry.frecency(now))
+
+    def _word_candidates(self, terms):
+        """Ids of the entries with a word starting with the most selective term.
+
+        Returns ``None`` when even that term matches so many entries that
+        scanning in frecency order finds the best ones sooner.
+        """
+        best = None
+        for term in terms:
+            low = bisect_left(self.words, term)
+            high = bisect_left(self.words, term + '\uffff')
+            size = 0
+            for index in range(low, high):
+                size += len(self.postings[self.words[index]])
+                if size > SCAN_THRESHOLD or (best is not None and size >= best[0]):
+                    break
+            else:
+                if best is None or size < best[0]:
+                    best = (size, low, high)
+        if best is None:
+            return None
+
+        _, low, high = best
+        candidates = set()
+        for word in self.words[low:high]:
+            candidates.update(self.postings[word])
+        return candidates
+
+    def _scan(self, predicate, limit):
+        """Walk entries best-first until enough match; used for very short prefixes.
+
+        A stale order is still used: entries changed since it was made are
+        checked on their own, and re-ranking is left to the caller.
+        """
+        if self._ranked is None:
+            self.rerank()
+        now = time.time()
+
+        # Entries updated since the ranking was made are checked separately
+        changed = self._changed
+        results = [entry for entry in map(self.entries.get, changed) if entry is not None and predicate(entry)]
+        found = 0
+        for entry in self._ranked:
+            if entry.id in changed or entry.id not in self.entries:
+                continue
+            if predicate(entry):
+                results.append(entry)
+                found += 1
+                if found >= limit:
+                    break
+        return heapq.nlargest(limit, results, key=lambda entry: entry.frecency(now))
+
+    # --- internals ---
+
+    def _entry(self, url, title=''):
+        entry = self.by_url.get(url)
+        if entry is None:
+            entry = CompletionEntry(self._next_id, url)
+            self._next_id += 1
+            self.entries[entry.id] = entry
+            self.by_url[url] = entry
+            self._new_url_keys.append((entry.key, entry.id))
+            self._set_words(entry, title)
+        return entry
+
+    def _sort_keys(self):
+        """Merge keys added since the last lookup into the sorted key lists."""
+        if self._new_words:
+            self._merge(self.words, self._new_words)
+            self._new_words = []
+        if self._new_url_keys:
+            self._merge(self.url_keys, self._new_url_keys)
+            self._new_url_keys = []
+
+    def _merge(self, keys, new_keys):
+        # A few keys (a visit) are inserted in place; a bulk load is sorted once
+        if len(new_keys) < BULK_THRESHOLD:
+            for key in new_keys:
+                insort(keys, key)
+        else:
+            keys += new_keys
+            keys.sort()
+
+    def _mark_changed(self, entry_id):
+        self._changed.add(entry_id)
+        if self._ranking_changed is not None:
+            self._ranking_changed.add(entry_id)
+
+    def _unpost(self, word, entry_id):
+        """Remove an entry from a word's postings; returns whether the word is now unused."""
+        ids = self.postings[word]
+        ids.discard(entry_id)
+        if not ids:
+            del self.postings[word]
+            return True
+        return False
+
+    def _remove_keys(self, keys, removed):
+        # Like _merge: a few keys are deleted in place, many in one pass
+        if len(removed) < BULK_THRESHOLD:
+            for key in removed:
+                del keys[bisect_left(keys, key)]
+        else:
+            removed = set(removed)
+            keys[:] = [key for key in keys if key not in removed]
+
+    def _set_words(self, entry, title):
+        entry.title = title
+        words = set(_WORD_RE.findall(entry.key)) | set(_WORD_RE.findall(title.lower()))
+        old_words = set(entry.words)
+        unused = [word for word in old_words - words if self._unpost(word, entry.id)]
+        if unused:
+            self._sort_keys()
+            self._remove_keys(self.words, unused)
+        for word in words - old_words:
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                self._new_words.append(word)
+            ids.add(entry.id)
+        entry.words = tuple(words)
+
+    def _forget_unused(self, entries):
+        """Remove the entries that are no longer a link, in history or open."""
+        unused_words = []
+        unused_keys = []
+        for entry in entries:
+            if entry.visit_count or entry.is_link or entry.open_tabs:
+                continue
+            unused_words.extend(word for word in entry.words if self._unpost(word, entry.id))
+            unused_keys.append((entry.key, entry.id))
+            del self.entries[entry.id]
+            del self.by_url[entry.url]
+        if unused_keys:
+            self._sort_keys()
+            self._remove_keys(self.words, unused_words)
+            self._remove_keys(self.url_keys, unused_keys)
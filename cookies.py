@@ -0,0 +1,192 @@
+"""Cookie records, a per-domain index and Netscape / JSON cookie files.
+
+``CookieIndex`` mirrors the profile's cookie store: the browser feeds it
+from the store's ``cookieAdded`` and ``cookieRemoved`` signals, and reads
+it to list, export or delete cookies by domain without asking the store.
+
+Two file formats are read and written:
+
+* Netscape ``cookies.txt`` (curl, wget, yt-dlp), with the ``#HttpOnly_`` prefix
+* JSON: a list of objects with the field names browser extensions use
+  (``domain``, ``name``, ``value``, ``path``, ``secure``, ``httpOnly``,
+  ``hostOnly``, ``expirationDate``, ``sameSite``)
+"""
+import json
+import os
+
+
+NETSCAPE_HEADER = '# Netscape HTTP Cookie File\n'
+HTTP_ONLY_PREFIX = '#HttpOnly_'
+
+
+def normalize_domain(domain):
+    return domain.strip().lstrip('.').lower()
+
+
+class Cookie:
+    """One cookie, independent of Qt."""
+
+    __slots__ = ('name', 'value', 'domain', 'path', 'expires', 'secure', 'http_only', 'host_only', 'same_site')
+
+    def __init__(self, name, value, domain, path='/', expires=None, secure=False, http_only=False,
+                 host_only=False, same_site=''):
+        self.name = name
+        self.value = value
+        self.domain = domain          # as set; a leading dot means subdomains match too
+        self.path = path or '/'
+        self.expires = expires        # unix time, None for a session cookie
+        self.secure = secure
+        self.http_only = http_only
+        self.host_only = host_only
+        self.same_site = same_site    # '', 'lax', 'strict' or 'none'
+
+    @property
+    def key(self):
+        """Name, domain and path identify a cookie; a newer one with the same key replaces it."""
+        return (self.name, self.domain.lower(), self.path)
+
+    @property
+    def host(self):
+        return normalize_domain(self.domain)
+
+    def __repr__(self):
+        return f'Cookie({self.name!r}, domain={self.domain!r}, path={self.path!r})'
+
+
+class CookieIndex:
+    """Cookies grouped by domain (without the leading dot)."""
+
+    def __init__(self):
+        self.by_domain = {}
+
+    def __len__(self):
+        return sum(len(cookies) for cookies in self.by_domain.values())
+
+    def add(self, cookie):
+        self.by_domain.setdefault(cookie.host, {})[cookie.key] = cookie
+
+    def remove(self, cookie):
+        cookies = self.by_domain.get(cookie.host)
+        if cookies is not None:
+            cookies.pop(cookie.key, None)
+            if not cookies:
+                del self.by_domain[cookie.host]
+
+    def clear(self):
+        self.by_domain.clear()
+
+    def domains(self):
+        """``(domain, cookie count)`` pairs, sorted by domain."""
+        return sorted((domain, len(cookies)) for domain, cookies in self.by_domain.items())
+
+    def for_domain(self, domain, include_subdomains=True):
+        """Cookies set for ``domain`` and, optionally, for its subdomains."""
+        domain = normalize_domain(domain)
+        found = list(self.by_domain.get(domain, {}).values())
+        if include_subdomains:
+            suffix = '.' + domain
+            for other, cookies in self.by_domain.items():
+                if other.endswith(suffix):
+                    found.extend(cookies.values())
+        return found
+
+    def all(self):
+        return [cookie for cookies in self.by_domain.values() for cookie in cookies.values()]
+
+
+# --- Netscape cookies.txt ---
+
+def parse_netscape(text):
+    cookies = []
+    for line in text.splitlines():
+        http_only = line.startswith(HTTP_ONLY_PREFIX)
+        if http_only:
+            line = line[len(HTTP_ONLY_PREFIX):]
+        elif not line.strip() or line.startswith('#'):
+            continue
+        fields = line.rstrip('\r\n').split('\t')
+        if len(fields) != 7:
+            continue
+        domain, subdomains, path, secure, expires, name, value = fields
+        try:
+            expires = int(expires)
+        except ValueError:
+            continue
+        include_subdomains = subdomains.upper() == 'TRUE'
+        if include_subdomains and not domain.startswith('.'):
+            domain = '.' + domain
+        cookies.append(Cookie(name, value, domain, path, expires or None, secure.upper() == 'TRUE',
+                              http_only, host_only=not include_subdomains))
+    return cookies
+
+
+def format_netscape(cookies):
+    lines = [NETSCAPE_HEADER]
+    for cookie in cookies:
+        prefix = HTTP_ONLY_PREFIX if cookie.http_only else ''
+        subdomains = 'FALSE' if cookie.host_only or not cookie.domain.startswith('.') else 'TRUE'
+        lines.append('\t'.join((
+            prefix + cookie.domain, subdomains, cookie.path, 'TRUE' if cookie.secure else 'FALSE',
+            str(int(cookie.expires or 0)), cookie.name, cookie.value)) + '\n')
+    return ''.join(lines)
+
+
+# --- JSON ---
+
+def parse_json(text):
+    cookies = []
+    for item in json.loads(text):
+        if not isinstance(item, dict) or 'name' not in item or 'domain' not in item:
+            continue
+        expires = item.get('expirationDate', item.get('expires'))
+        session = item.get('session', expires in (None, -1, 0))
+        host_only = bool(item.get('hostOnly', False))
+        domain = item['domain']
+        if not host_only and not domain.startswith('.') and 'hostOnly' in item:
+            domain = '.' + domain
+        same_site = str(item.get('sameSite') or '').lower()
+        cookies.append(Cookie(
+            str(item['name']), str(item.get('value', '')), domain, item.get('path', '/'),
+            None if session else float(expires), bool(item.get('secure', False)),
+            bool(item.get('httpOnly', False)), host_only,
+            same_site if same_site in ('lax', 'strict', 'none') else ''))
+    return cookies
+
+
+def format_json(cookies):
+    items = []
+    for cookie in cookies:
+        item = {
+            'domain': cookie.domain,
+            'name': cookie.name,
+            'value': cookie.value,
+            'path': cookie.path,
+            'secure': cookie.secure,
+            'httpOnly': cookie.http_only,
+            'hostOnly': cookie.host_only or not cookie.domain.startswith('.'),
+            'session': cookie.expires is None,
+        }
+        if cookie.expires is not None:
+            item['expirationDate'] = cookie.expires
+        if cookie.same_site:
+            item['sameSite'] = cookie.same_site
+        items.append(item)
+    return json.dumps(items, indent=1)
+
+
+def read_cookie_file(path):
+    """Cookies from a Netscape or JSON file, told apart by content."""
+    with open(path, 'r', encoding='utf-8') as file:
+        text = file.read()
+    if text.lstrip().startswith('['):
+        return parse_json(text)
+    return parse_netscape(text)
+
+
+def write_cookie_file(path, cookies):
+    """Write cookies as JSON if ``path`` ends in .json, else in Netscape format."""
+    text = format_json(cookies) if path.lower().endswith('.json') else format_netscape(cookies)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temp_path, path)
@@ -0,0 +1,222 @@
+"""Element hiding (cosmetic) rules compiled into stylesheets.
+
+``##selector`` rules hide matching elements on every site, and
+``example.com,~shop.example.com##selector`` rules only on some.
+``example.com#@#selector`` turns a rule off for a site.  Rules are split
+once, when the filter lists are loaded, into:
+
+* one generic stylesheet, shared by every page of the profile
+* selectors per domain, turned into a stylesheet per host on first use and
+  kept in a small cache
+
+Every selector gets a rule of its own, so a selector the browser does not
+understand only loses itself rather than a whole group.  The split is saved
+next to the compiled network filters and reused until the lists change.
+"""
+import json
+import os
+import re
+from collections import OrderedDict
+
+from adblock import filter_sources, host_suffixes
+
+
+COSMETIC_COMPILED_PATH = 'cosmetic.compiled'
+STYLESHEET_CACHE_SIZE = 256
+HIDE_DECLARATION = '{display:none !important}'
+
+# Extended selectors of uBlock Origin / AdGuard that need a script, not CSS
+_UNSUPPORTED_MARKERS = (':-abp-', ':has-text(', ':xpath(', ':matches-css', ':style(', ':upward(',
+                        ':remove(', ':min-text-length(', ':watch-attr(', ':matches-path(', ':others(')
+_DOMAINS_RE = re.compile(r'^[a-z0-9.,~*\-]*$', re.IGNORECASE)
+
+
+def parse_cosmetic(line):
+    """Split an element hiding rule into ``(include, exclude, selector, is_exception)``.
+
+    Returns ``None`` for anything else, including snippet rules and extended
+    selectors that CSS can't express.
+    """
+    text = line.strip()
+    if not text or text.startswith(('!', '[')):
+        return None
+    for separator, is_exception in (('#@#', True), ('##', False)):
+        position = text.find(separator)
+        if position >= 0:
+            break
+    else:
+        return None
+
+    domains = text[:position]
+    selector = text[position + len(separator):].strip()
+    if not selector or selector.startswith('+js(') or any(marker in selector for marker in _UNSUPPORTED_MARKERS):
+        return None
+    if '{' in selector or '}' in selector or '/*' in selector:
+        return None  # would break out of the rule
+
+    if not _DOMAINS_RE.match(domains):
+        return None  # a network rule that happens to contain the separator
+
+    include, exclude = [], []
+    for domain in domains.lower().split(','):
+        domain = domain.strip()
+        if domain.startswith('~'):
+            exclude.append(domain[1:])
+        elif domain:
+            include.append(domain)
+    return include, exclude, selector, is_exception
+
+
+class CosmeticFilters:
+    """Generic and per-domain element hiding selectors, served as stylesheets."""
+
+    def __init__(self, lines=()):
+        self.generic = {}          # selector -> None, kept in list order
+        self.by_domain = {}        # domain -> {selector: None}
+        self.disabled = {}         # domain -> set of selectors turned off there
+        self._generic_css = None
+        self._cache = OrderedDict()
+        self.add_filters(lines)
+
+    def __len__(self):
+        return len(self.generic) + sum(len(selectors) for selectors in self.by_domain.values())
+
+    def add_filters(self, lines):
+        for line in lines:
+            if '#' in line:
+                self.add(line)
+
+    def add(self, line):
+        """Add one rule; returns whether the line was an element hiding rule."""
+        rule = parse_cosmetic(line)
+        if rule is None:
+            return False
+        include, exclude, selector, is_exception = rule
+        if is_exception:
+            for domain in include:
+                self.disabled.setdefault(domain, set()).add(selector)
+        elif include:
+            for domain in include:
+                self.by_domain.setdefault(domain, {})[selector] = None
+            for domain in exclude:
+                self.disabled.setdefault(domain, set()).add(selector)
+        else:
+            self.generic[selector] = None
+            for domain in exclude:
+                self.disabled.setdefault(domain, set()).add(selector)
+        self._generic_css = None
+        self._cache.clear()
+        return True
+
+    @property
+    def generic_stylesheet(self):
+        """The stylesheet of the rules that apply everywhere; built once."""
+        if self._generic_css is None:
+            self._generic_css = stylesheet(self.generic)
+        return self._generic_css
+
+    def site_stylesheet(self, host):
+        """``(css, replaces_generic)`` for a host.
+
+        ``css`` holds the host's own rules.  When a rule that is off for the
+        host is generic, ``css`` holds the complete stylesheet instead and
+        ``replaces_generic`` is true, so the shared one must not be applied.
+        """
+        host = host.lower()
+        cached = self._cache.get(host)
+        if cached is not None:
+            self._cache.move_to_end(host)
+            return cached
+
+        suffixes = list(host_suffixes(host)) if host else []
+        disabled = set()
+        for domain in suffixes:
+            disabled.update(self.disabled.get(domain, ()))
+        selectors = {}
+        for domain in reversed(suffixes):
+            selectors.update(self.by_domain.get(domain, {}))
+
+        replaces_generic = any(selector in self.generic for selector in disabled)
+        if replaces_generic:
+            selectors = {**self.generic, **selectors}
+        result = (stylesheet(selector for selector in selectors if selector not in disabled), replaces_generic)
+
+        self._cache[host] = result
+        if len(self._cache) > STYLESHEET_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    # --- compiled cache ---
+
+    def write_compiled(self, path, source_hash, source_stamp=b''):
+        # A one-line header first, so a stale file is found without parsing the rules
+        header = {'hash': source_hash.hex(), 'stamp': source_stamp.hex()}
+        data = {
+            'generic': list(self.generic),
+            'domains': {domain: list(selectors) for domain, selectors in self.by_domain.items()},
+            'disabled': {domain: sorted(selectors) for domain, selectors in self.disabled.items()},
+        }
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(header) + '\n')
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load_compiled(cls, path, sources=None):
+        """Load a compiled rule split; return ``None`` if it is missing, corrupt or stale.
+
+        ``sources`` is an ``adblock.FilterSources``; ``None`` accepts any.  A
+        file whose sources were only touched is written again with the new
+        stamp, so the next load doesn't read the lists.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                header = json.loads(file.readline())
+                stamp = bytes.fromhex(header['stamp'])
+                if sources is not None and not sources.matches(stamp, bytes.fromhex(header['hash'])):
+                    return None
+                data = json.load(file)
+            filters = cls()
+            filters.generic = dict.fromkeys(data['generic'])
+            filters.by_domain = {domain: dict.fromkeys(selectors) for domain, selectors in data['domains'].items()}
+            filters.disabled = {domain: set(selectors) for domain, selectors in data['disabled'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        if sources is not None and stamp != sources.stamp:
+            try:
+                filters.write_compiled(path, sources.digest, sources.stamp)
+            except OSError as e:
+                print(f"Could not update compiled cosmetic filters: {e}")
+        return filters
+
+
+def stylesheet(selectors):
+    return '\n'.join(selector + HIDE_DECLARATION for selector in selectors)
+
+
+def load_cosmetic_filters(paths=None, compiled_path=COSMETIC_COMPILED_PATH):
+    """Load the element hiding rules from their compiled cache, rebuilding it if the lists changed."""
+    sources = filter_sources(paths)
+    filters = CosmeticFilters.load_compiled(compiled_path, sources)
+    if filters is not None:
+        return filters
+
+    filters = CosmeticFilters(sources.lines)
+    try:
+        filters.write_compiled(compiled_path, sources.digest, sources.stamp)
+    except OSError as e:
+        print(f"Could not write compiled cosmetic filters: {e}")
+    return filters
+
+
+_shared_filters = {}
+
+
+def shared_cosmetic_filters(paths=None, compiled_path=COSMETIC_COMPILED_PATH):
+    """Return the process-wide element hiding rules, loading them on first use."""
+    key = (tuple(paths) if paths is not None else None, compiled_path)
+    filters = _shared_filters.get(key)
+    if filters is None:
+        filters = _shared_filters[key] = load_cosmetic_filters(paths, compiled_path)
+    return filters
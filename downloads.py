@@ -0,0 +1,204 @@
+"""Download queue with a concurrency limit, and transfer rate estimates.
+
+QtWebEngine cancels a download that isn't accepted while it is being
+offered, so every download is accepted straight away and ``DownloadQueue``
+pauses the ones beyond the limit; they are resumed in arrival order as
+running ones finish.  Progress is read by ``DownloadQueue.sample`` on a
+fixed timer instead of on every progress signal, so dozens of transfers
+cost the GUI a few refreshes a second however fast they go.
+
+The queue only calls ``pause``, ``resume``, ``cancel``, ``receivedBytes``
+and ``totalBytes`` on the requests it is given.
+"""
+import time
+from collections import deque
+
+
+RATE_WINDOW_SECONDS = 5.0   # transfer rate is averaged over this much recent progress
+
+QUEUED = 'queued'
+PAUSED = 'paused'
+DOWNLOADING = 'downloading'
+COMPLETED = 'completed'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+
+
+class RateMeter:
+    """Bytes per second over a sliding window of samples."""
+
+    def __init__(self, window=RATE_WINDOW_SECONDS):
+        self.window = window
+        self.samples = deque()
+
+    def update(self, received, now):
+        self.samples.append((now, received))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def reset(self):
+        """Forget the samples, e.g. while paused, so the pause doesn't drag the rate down."""
+        self.samples.clear()
+
+    @property
+    def rate(self):
+        if len(self.samples) < 2:
+            return 0.0
+        (start, first), (end, last) = self.samples[0], self.samples[-1]
+        return (last - first) / (end - start) if end > start else 0.0
+
+
+class Download:
+    """One download in the queue, with the progress last sampled from its request."""
+
+    __slots__ = ('request', 'url', 'path', 'state', 'received', 'total', 'started', 'finished', 'meter', 'error')
+
+    def __init__(self, request, url='', path=''):
+        self.request = request
+        self.url = url
+        self.path = path
+        self.state = DOWNLOADING
+        self.received = 0
+        self.total = -1           # -1 while the size is unknown
+        self.started = time.time()
+        self.finished = None
+        self.meter = RateMeter()
+        self.error = ''
+
+    @property
+    def is_finished(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def rate(self):
+        return self.meter.rate if self.state == DOWNLOADING else 0.0
+
+    @property
+    def eta(self):
+        """Seconds left at the current rate, or None if it can't be told."""
+        rate = self.rate
+        if self.total <= 0 or rate <= 0:
+            return None
+        return max(self.total - self.received, 0) / rate
+
+
+class DownloadQueue:
+    """Downloads in arrival order; at most ``max_active`` transfer at a time."""
+
+    def __init__(self, max_active=3):
+        self.max_active = max(1, max_active)
+        self.downloads = []
+
+    def add(self, request, url='', path=''):
+        """Track an accepted request, pausing it if the limit is reached."""
+        download = Download(request, url, path)
+        self.downloads.append(download)
+        if self.active_count() > self.max_active:
+            request.pause()
+            download.state = QUEUED
+        return download
+
+    def set_max_active(self, max_active):
+        self.max_active = max(1, max_active)
+        # Running downloads beyond a lowered limit go back to the front of the queue
+        running = [download for download in self.downloads if download.state == DOWNLOADING]
+        for download in running[self.max_active:]:
+            download.request.pause()
+            download.state = QUEUED
+            download.meter.reset()
+        self._schedule()
+
+    def pause(self, download):
+        if download.state in (DOWNLOADING, QUEUED):
+            if download.state == DOWNLOADING:
+                download.request.pause()
+            download.state = PAUSED
+            download.meter.reset()
+            self._schedule()
+
+    def resume(self, download):
+        """Resume a paused download now, or queue it if the limit is reached."""
+        if download.state == PAUSED:
+            download.state = QUEUED
+            self._schedule()
+
+    def cancel(self, download):
+        if not download.is_finished:
+            download.request.cancel()
+            self.finish(download, CANCELLED)
+
+    def finish(self, download, state, error=''):
+        """Mark a download finished (completed, cancelled or failed) and start the next one."""
+        if download.is_finished:
+            return
+        download.state = state
+        download.error = error
+        download.finished = time.time()
+        download.received = max(download.received, download.request.receivedBytes())
+        self._schedule()
+
+    def clear_finished(self):
+        """Drop finished downloads from the list; returns how many went."""
+        kept = [download for download in self.downloads if not download.is_finished]
+        removed = len(self.downloads) - len(kept)
+        self.downloads = kept
+        return removed
+
+    def active_count(self):
+        return sum(download.state == DOWNLOADING for download in self.downloads)
+
+    def count(self, state):
+        return sum(download.state == state for download in self.downloads)
+
+    def sample(self, now=None):
+        """Read the progress of running downloads; returns whether any is unfinished."""
+        now = time.monotonic() if now is None else now
+        unfinished = False
+        for download in self.downloads:
+            if download.is_finished:
+                continue
+            unfinished = True
+            download.total = download.request.totalBytes()  # known for queued ones too, for the ETA
+            if download.state == DOWNLOADING:
+                download.received = download.request.receivedBytes()
+                download.meter.update(download.received, now)
+        return unfinished
+
+    def throughput(self):
+        """Combined bytes per second of the running downloads."""
+        return sum(download.rate for download in self.downloads)
+
+    def eta(self):
+        """Seconds until every unfinished download of known size is done, or None."""
+        rate = self.throughput()
+        remaining = sum(max(download.total - download.received, 0) for download in self.downloads
+                        if not download.is_finished and download.total > 0)
+        if rate <= 0 or not remaining:
+            return None
+        return remaining / rate
+
+    def _schedule(self):
+        for download in self.downloads:
+            if self.active_count() >= self.max_active:
+                break
+            if download.state == QUEUED:
+                download.request.resume()
+                download.state = DOWNLOADING
+
+
+def format_bytes(size):
+    size = float(size)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ''
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
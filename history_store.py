@@ -0,0 +1,321 @@
+"""Browsing and download history kept in SQLite.
+
+Writes never touch the disk on the calling (GUI) thread: they are queued and
+a background thread applies them in batches, one transaction per batch,
+after a short debounce.  Reads go through one connection per reading thread;
+the database runs in WAL mode so they never wait for the writer.  Reads the
+GUI shouldn't wait for run on one long-lived reader thread (``run_read``),
+so however many pages are fetched there are only ever two read connections.
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from tracing import now_us, tracer
+
+
+HISTORY_DB_PATH = 'history.db'
+LEGACY_HISTORY_PATH = 'history.json'
+WRITE_DEBOUNCE_SECONDS = 0.5
+MAX_BATCH = 1000
+IGNORED_SCHEMES = ('about', 'data', 'blob', 'chrome', 'view-source')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    host TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    visit_count INTEGER NOT NULL DEFAULT 0,
+    last_visit REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_host ON urls(host);
+CREATE INDEX IF NOT EXISTS urls_recent ON urls(last_visit, url);
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY,
+    url_id INTEGER NOT NULL REFERENCES urls(id) ON DELETE CASCADE,
+    visit_time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS visits_url ON visits(url_id);
+CREATE INDEX IF NOT EXISTS visits_time ON visits(visit_time);
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    path TEXT NOT NULL,
+    state TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    started REAL NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS downloads_finished ON downloads(finished);
+"""
+
+
+def connect(path, check_same_thread=True):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=check_same_thread)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute('PRAGMA foreign_keys=ON')
+    return connection
+
+
+def url_host(url):
+    try:
+        return urlsplit(url).hostname or ''
+    except ValueError:
+        return ''
+
+
+class HistoryEntry:
+    """One row of the history: a URL with its title and visit statistics."""
+
+    __slots__ = ('url', 'title', 'visit_count', 'last_visit')
+
+    def __init__(self, url, title, visit_count, last_visit):
+        self.url = url
+        self.title = title
+        self.visit_count = visit_count
+        self.last_visit = last_visit
+
+    def __repr__(self):
+        return f'HistoryEntry({self.url!r}, visits={self.visit_count})'
+
+
+class DownloadEntry:
+    """A finished download: where it came from, where it went and how it ended."""
+
+    __slots__ = ('url', 'path', 'state', 'size', 'started', 'finished')
+
+    def __init__(self, url, path, state, size, started, finished):
+        self.url = url
+        self.path = path
+        self.state = state
+        self.size = size
+        self.started = started
+        self.finished = finished
+
+    def __repr__(self):
+        return f'DownloadEntry({self.path!r}, {self.state})'
+
+
+class HistoryStore:
+    """SQLite history with a debounced background writer."""
+
+    def __init__(self, path=HISTORY_DB_PATH, legacy_path=LEGACY_HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._readers = []
+        self._read_executor = None
+        self.reader.executescript(SCHEMA)
+        self.reader.commit()
+
+        self.pending = queue.Queue()
+        self.closed = False
+        self.writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self.writer.start()
+
+        if legacy_path and os.path.exists(legacy_path) and not self.count():
+            self._import_legacy(legacy_path)
+
+    # --- writes (queued) ---
+
+    def add_visit(self, url, title='', when=None):
+        """Record a visit to ``url``."""
+        if not url or url.split(':', 1)[0] in IGNORED_SCHEMES:
+            return
+        self.pending.put(('visit', url, url_host(url), title or '', when or time.time()))
+
+    def set_title(self, url, title):
+        """Update the title of an already visited URL."""
+        if url and title:
+            self.pending.put(('title', url, title))
+
+    def delete_urls(self, urls):
+        """Forget every visit to the given URLs, as one batched write."""
+        urls = list(urls)
+        if urls:
+            self.pending.put(('delete', urls))
+
+    def clear(self):
+        self.pending.put(('clear',))
+
+    def add_download(self, url, path, state, size, started, finished=None):
+        """Record a download that has finished, failed or been cancelled."""
+        self.pending.put(('download', url, path, state, size, started, finished or time.time()))
+
+    def clear_downloads(self):
+        self.pending.put(('clear_downloads',))
+
+    def flush(self):
+        """Block until every queued write has been committed."""
+        if self.closed:
+            return
+        done = threading.Event()
+        self.pending.put(('flush', done))
+        done.wait()
+
+    def close(self):
+        """Commit pending writes and stop the writer thread."""
+        if self.closed:
+            return
+        self.pending.put(('stop',))
+        self.writer.join()
+        self.closed = True
+        if self._read_executor is not None:
+            self._read_executor.shutdown(wait=True)
+        for connection in self._readers:
+            connection.close()
+
+    # --- reads ---
+
+    @property
+    def reader(self):
+        """The calling thread's read connection, so pages can be loaded off the GUI thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Only used by its own thread, but closed from whichever thread calls close()
+            connection = self._local.connection = connect(self.path, check_same_thread=False)
+            self._readers.append(connection)
+        return connection
+
+    def run_read(self, function, *args):
+        """Run ``function(*args)`` on the store's reader thread; returns a Future."""
+        if self._read_executor is None:
+            self._read_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-reader')
+        return self._read_executor.submit(function, *args)
+
+    def count(self):
+        return self.reader.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+
+    def recent(self, limit=100, offset=0):
+        """Most recently visited URLs first."""
+        rows = self.reader.execute(
+            'SELECT url, title, visit_count, last_visit FROM urls ORDER BY last_visit DESC LIMIT ? OFFSET ?',
+            (limit, offset))
+        return [HistoryEntry(*row) for row in rows]
+
+    def page(self, text='', after=None, limit=100):
+        """One page of history, most recent first, optionally filtered by ``text``.
+
+        ``after`` is the last entry of the previous page.  Pages are found
+        by keyset rather than OFFSET, so deep pages cost as much as the first.
+        """
+        conditions, parameters = [], []
+        if text:
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append("(url LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\')")
+            parameters += [pattern, pattern]
+        if after is not None:
+            conditions.append('(last_visit, url) < (?, ?)')
+            parameters += [after.last_visit, after.url]
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+        rows = self.reader.execute(
+            f'SELECT url, title, visit_count, last_visit FROM urls {where}ORDER BY last_visit DESC, url DESC LIMIT ?',
+            parameters + [limit])
+        return [HistoryEntry(*row) for row in rows]
+
+    def downloads(self, limit=100):
+        """Most recently finished downloads first."""
+        rows = self.reader.execute(
+            'SELECT url, path, state, size, started, finished FROM downloads ORDER BY finished DESC LIMIT ?',
+            (limit,))
+        return [DownloadEntry(*row) for row in rows]
+
+    # --- writer thread ---
+
+    def _write_loop(self):
+        connection = connect(self.path)
+        running = True
+        while running:
+            batch = [self.pending.get()]
+            # Debounce: give a burst of navigations the chance to share one transaction
+            deadline = time.monotonic() + WRITE_DEBOUNCE_SECONDS
+            while len(batch) < MAX_BATCH and batch[-1][0] not in ('flush', 'stop'):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            waiters = []
+            started = now_us()
+            try:
+                with connection:
+                    for operation in batch:
+                        kind = operation[0]
+                        if kind == 'flush':
+                            waiters.append(operation[1])
+                        elif kind == 'stop':
+                            running = False
+                        else:
+                            self._apply(connection, operation)
+            except sqlite3.Error as e:
+                print(f"Could not write history: {e}")
+            if tracer.enabled and len(batch) > len(waiters) + (not running):
+                tracer.add('history.write_batch', 'history', started)  # a span per committed transaction
+            for done in waiters:
+                done.set()
+        connection.close()
+
+    def _apply(self, connection, operation):
+        kind = operation[0]
+        if kind == 'visit':
+            _, url, host, title, when = operation
+            connection.execute(
+                "INSERT INTO urls (url, host, title, visit_count, last_visit) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(url) DO UPDATE SET visit_count = visit_count + 1, "
+                "last_visit = MAX(last_visit, excluded.last_visit), "
+                "title = CASE WHEN excluded.title != '' THEN excluded.title ELSE title END",
+                (url, host, title, when))
+            connection.execute(
+                'INSERT INTO visits (url_id, visit_time) SELECT id, ? FROM urls WHERE url = ?', (when, url))
+        elif kind == 'title':
+            connection.execute('UPDATE urls SET title = ? WHERE url = ?', (operation[2], operation[1]))
+        elif kind == 'delete':
+            urls = operation[1]
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                connection.execute(
+                    f"DELETE FROM urls WHERE url IN ({','.join('?' * len(chunk))})", chunk)
+        elif kind == 'clear':
+            connection.execute('DELETE FROM visits')
+            connection.execute('DELETE FROM urls')
+        elif kind == 'download':
+            connection.execute(
+                'INSERT INTO downloads (url, path, state, size, started, finished) VALUES (?, ?, ?, ?, ?, ?)',
+                operation[1:])
+        elif kind == 'clear_downloads':
+            connection.execute('DELETE FROM downloads')
+
+    def _import_legacy(self, legacy_path):
+        """Carry over the URLs of the old history.json (newest first)."""
+        try:
+            with open(legacy_path, 'r') as file:
+                urls = json.load(file)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for age, url in enumerate(urls):
+            if isinstance(url, str):
+                self.add_visit(url, when=now - age)
+        self.flush()
+
+
+_shared_stores = {}
+
+
+def shared_history(path=HISTORY_DB_PATH):
+    """Return the process-wide history store for ``path``, opening it on first use."""
+    store = _shared_stores.get(path)
+    if store is None:
+        store = _shared_stores[path] = HistoryStore(path)
+        atexit.register(store.close)
+    return store
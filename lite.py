@@ -0,0 +1,148 @@
+"""Lite mode: skip heavy subresources on sites where data is expensive.
+
+On a lite site the interceptor drops media, fonts and plugin content from
+any host, and scripts, images and frames from third parties.  Pages keep
+their own markup, styles, first-party scripts and images, so they stay
+usable.  The decision for a request depends only on the page's site, the
+requested host and the resource type, so it is worked out once per
+``(site, host, type)`` and looked up after that.
+
+Sites are hosts; turning lite mode on for ``example.com`` covers its
+subdomains too.  The list is kept in ``lite_sites.json``, and
+``SBROWS_LITE=1`` turns lite mode on for every site.  Requests skipped and
+the bytes they would probably have cost are counted per site.
+"""
+import json
+import os
+import threading
+
+from adblock import host_suffixes, is_third_party
+from telemetry import ESTIMATED_BYTES, DEFAULT_ESTIMATED_BYTES
+
+
+LITE_SITES_PATH = 'lite_sites.json'
+DECISION_CACHE_SIZE = 8192
+
+# Resource types skipped on lite sites: from any host, or only from third parties
+SKIPPED_TYPES = frozenset(('media', 'font', 'object'))
+THIRD_PARTY_SKIPPED_TYPES = frozenset(('script', 'image', 'subdocument'))
+
+
+def site_of(host):
+    """The site a host is listed under when lite mode is turned on from it."""
+    host = host.lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class LiteSiteStats:
+    __slots__ = ('requests', 'bytes')
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+
+
+class LiteMode:
+    """Sites in lite mode, the cached skip decisions and what skipping saved."""
+
+    def __init__(self, path=LITE_SITES_PATH, everywhere=False):
+        self.path = path
+        self.everywhere = everywhere
+        self.sites = set()
+        self.lock = threading.Lock()
+        self.by_site = {}
+        self.requests = 0
+        self.bytes = 0
+        self._decisions = {}
+        if path:
+            self.load()
+
+    @property
+    def active(self):
+        """Whether any request could be skipped; the interceptor checks this first."""
+        return self.everywhere or bool(self.sites)
+
+    def enabled_for(self, host):
+        if self.everywhere:
+            return True
+        host = host.lower()
+        return any(suffix in self.sites for suffix in host_suffixes(host)) if host else False
+
+    def toggle(self, host):
+        """Turn lite mode on or off for a page's site; returns the new state."""
+        host = host.lower()
+        listed = [suffix for suffix in host_suffixes(host) if suffix in self.sites] if host else []
+        if listed:
+            self.sites.difference_update(listed)
+        elif host:
+            self.sites.add(site_of(host))
+        self._decisions = {}
+        self.save()
+        return self.enabled_for(host)
+
+    def skip(self, page_host, host, resource_type):
+        """Whether to skip a request; ``resource_type`` uses the filter-list names."""
+        key = (page_host, host, resource_type)
+        decision = self._decisions.get(key)
+        if decision is None:
+            if len(self._decisions) >= DECISION_CACHE_SIZE:
+                self._decisions = {}
+            decision = self._decisions[key] = self._decide(page_host, host, resource_type)
+        return decision
+
+    def _decide(self, page_host, host, resource_type):
+        if not page_host or not self.enabled_for(page_host):
+            return False
+        if resource_type in SKIPPED_TYPES:
+            return True
+        return resource_type in THIRD_PARTY_SKIPPED_TYPES and is_third_party(host, page_host)
+
+    def record(self, page_host, resource_type):
+        """Account for one skipped request."""
+        size = ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        site = site_of(page_host)
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+            stats = self.by_site.get(site)
+            if stats is None:
+                stats = self.by_site[site] = LiteSiteStats()
+            stats.requests += 1
+            stats.bytes += size
+
+    def site_stats(self, host):
+        """Return ``(requests skipped, estimated bytes saved)`` for a page's site."""
+        with self.lock:
+            stats = self.by_site.get(site_of(host))
+            return (stats.requests, stats.bytes) if stats else (0, 0)
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.sites = {site.lower() for site in json.load(file) if isinstance(site, str)}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Could not read lite mode sites: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(sorted(self.sites), file, indent=1)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not save lite mode sites: {e}")
+
+
+_shared_lite = None
+
+
+def shared_lite_mode():
+    """Return the process-wide lite mode settings, read on first use."""
+    global _shared_lite
+    if _shared_lite is None:
+        _shared_lite = LiteMode(everywhere=os.environ.get('SBROWS_LITE', '0') == '1')
+    return _shared_lite
@@ -0,0 +1,153 @@
+"""Offline snapshots of often visited pages, kept as MHTML files.
+
+The pages worth keeping are the quick links of ``links.txt``.  Each one is
+saved (by the browser, through ``QWebEnginePage.save``) into the snapshot
+directory after it loads, and the index records which file holds which
+page.  Reopening the page shows the snapshot straight away while the live
+page loads behind it.
+
+URLs are matched loosely: ``youtube.com`` in the links file covers
+``https://www.youtube.com/`` after its redirect.  The directory is bounded
+in size; the least recently shown snapshots go first.  A snapshot is not
+saved again more often than ``SNAPSHOT_REFRESH_SECONDS``.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+
+SNAPSHOT_DIR = 'snapshot_cache'  # under the profile's storage when the browser makes the cache
+SNAPSHOT_INDEX = 'index.json'
+SNAPSHOT_MAX_BYTES = 200 * 1024 * 1024
+SNAPSHOT_REFRESH_SECONDS = 10 * 60
+
+
+def snapshot_key(url):
+    """What two URLs share when they show the same snapshot: host without www., path and query."""
+    scheme, colon, _ = url.partition(':')
+    if not (colon and scheme.isalpha()):
+        url = 'https://' + url  # a bare host from links.txt
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        return None
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    key = host + parts.path.rstrip('/')
+    return f'{key}?{parts.query}' if parts.query else key
+
+
+def snapshot_id(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class SnapshotEntry:
+    __slots__ = ('id', 'url', 'path', 'size', 'saved')
+
+    def __init__(self, entry_id, url, path, size, saved):
+        self.id = entry_id
+        self.url = url          # the live page the snapshot was taken of
+        self.path = path
+        self.size = size
+        self.saved = saved
+
+
+class SnapshotCache:
+    """Index of saved snapshots, least recently shown first, within a byte budget."""
+
+    def __init__(self, urls=(), directory=SNAPSHOT_DIR, max_bytes=SNAPSHOT_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.wanted = {key for key in map(snapshot_key, urls) if key}
+        self.entries = OrderedDict()   # key -> SnapshotEntry
+        self.ids = {}                  # id -> key
+        self.pending = {}              # path being saved -> URL
+        self.total = 0
+        self.load()
+
+    def get(self, url):
+        """The snapshot of a page, marked as just used; None if there is none."""
+        key = snapshot_key(url)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.path):
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def by_id(self, entry_id):
+        key = self.ids.get(entry_id)
+        return self.entries.get(key) if key is not None else None
+
+    def needs_snapshot(self, url):
+        """Whether a page that just loaded should be saved: wanted, and missing or due a refresh."""
+        key = snapshot_key(url)
+        if key not in self.wanted:
+            return False
+        entry = self.entries.get(key)
+        return entry is None or time.time() - entry.saved > SNAPSHOT_REFRESH_SECONDS
+
+    def new_path(self, url):
+        """A fresh file for a page's next snapshot; the one being shown is never written over."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f'{snapshot_id(snapshot_key(url))}-{time.time_ns()}.mhtml')
+
+    def add(self, url, path):
+        """Record a saved snapshot, replacing the page's previous one and evicting over the budget."""
+        key = snapshot_key(url)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if key in self.entries:
+            self._remove(key)
+        entry = self.entries[key] = SnapshotEntry(snapshot_id(key), url, path, size, time.time())
+        self.ids[entry.id] = key
+        self.total += size
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            self._remove(next(iter(self.entries)))
+        self.save()
+        return entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.ids.pop(entry.id, None)
+        self.total -= entry.size
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+    def load(self):
+        try:
+            with open(os.path.join(self.directory, SNAPSHOT_INDEX), 'r', encoding='utf-8') as file:
+                items = json.load(file)
+            for item in items:
+                key = snapshot_key(item['url'])
+                entry = SnapshotEntry(snapshot_id(key), item['url'], item['path'], item['size'], item['saved'])
+                self.entries[key] = entry
+                self.ids[entry.id] = key
+                self.total += entry.size
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not read snapshot index: {e}")
+
+    def save(self):
+        """Write the index, least recently shown first so the order survives a restart."""
+        items = [{'url': entry.url, 'path': entry.path, 'size': entry.size, 'saved': entry.saved}
+                 for entry in self.entries.values()]
+        path = os.path.join(self.directory, SNAPSHOT_INDEX)
+        temp_path = f'{path}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(items, file, indent=1)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not save snapshot index: {e}")
@@ -0,0 +1,279 @@
+"""In-memory accounting of requests blocked by the ad blocker.
+
+``BlockStats.record`` runs on Qt's network IO thread for every blocked
+request, so it only touches in-memory counters under a lock.  Anything that
+does IO (the JSON-lines aggregate file and the optional verbose log) happens
+in ``flush``, which the GUI calls on a timer.
+
+Requests are counted for a page (a tab, or a batch job) into that page's own
+``PageStats``: each page tracks the URL it shows and starts a fresh
+``PageStats`` when it navigates, so two pages never share counts through a
+URL that was open in both at different times.
+
+``process_rss`` reads the resident memory of the browser and renderer
+processes, through psutil when it is installed and /proc otherwise.
+
+``TabMetrics`` times each tab's page loads, and ``MetricsLog`` streams the
+per-tab rows of the task manager to a JSON-lines file for offline analysis.
+``StartupTimeline`` records how long each stage of a cold start took.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+BLOCK_STATS_PATH = 'blocked_stats.jsonl'
+METRICS_LOG_PATH = 'tab_metrics.jsonl'
+STARTUP_LOG_PATH = 'startup_timeline.jsonl'
+RECENT_BLOCKS = 500       # size of the ring buffer of recent blocked requests
+MAX_PAGES = 1000          # tracked pages kept before the oldest are dropped (closed pages aren't untracked)
+TOP_ENTRIES = 20          # hosts/rules written per flush
+
+# Rough transfer sizes used to estimate what blocking saved, per resource type
+ESTIMATED_BYTES = {
+    'script': 30 * 1024,
+    'image': 20 * 1024,
+    'media': 500 * 1024,
+    'font': 40 * 1024,
+    'stylesheet': 15 * 1024,
+    'subdocument': 60 * 1024,
+    'object': 100 * 1024,
+    'xmlhttprequest': 3 * 1024,
+}
+DEFAULT_ESTIMATED_BYTES = 2 * 1024
+
+
+class PageStats:
+    """Requests and blocked requests of one page since it last navigated."""
+
+    __slots__ = ('requests', 'blocked', 'bytes_saved')
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.bytes_saved = 0
+
+
+class BlockStats:
+    """Counters, a ring buffer of recent blocks and a periodic JSON-lines flush."""
+
+    def __init__(self, path=BLOCK_STATS_PATH, verbose=False, sample_every=0):
+        self.path = path
+        self.verbose = verbose
+        self.sample_every = sample_every  # log every Nth block when not verbose, 0 = never
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_BLOCKS)
+        self.by_host = Counter()   # since the last flush
+        self.by_rule = Counter()
+        self.pages = {}            # first-party URL -> PageStats of the page showing it
+        self.total = 0
+        self.bytes_saved = 0
+        self._flushed_total = 0
+        self._logged_total = 0
+
+    def track_page(self, page_url, page, previous_url=None):
+        """Count requests made with ``page_url`` as first party into ``page`` from now on."""
+        with self.lock:
+            if previous_url is not None and self.pages.get(previous_url) is page:
+                del self.pages[previous_url]
+            if page_url:
+                self.pages.pop(page_url, None)  # re-inserted as the newest
+                if len(self.pages) >= MAX_PAGES:
+                    del self.pages[next(iter(self.pages))]
+                self.pages[page_url] = page
+
+    def untrack_page(self, page_url, page):
+        with self.lock:
+            if self.pages.get(page_url) is page:
+                del self.pages[page_url]
+
+    def count_request(self, page_url):
+        """Count a request made by a page, blocked or not."""
+        with self.lock:
+            page = self.pages.get(page_url)
+            if page is not None:
+                page.requests += 1
+
+    def record(self, url, host, rule, page_url, resource_type):
+        """Account for one blocked request; cheap enough for the interception path."""
+        size = ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        with self.lock:
+            self.total += 1
+            self.bytes_saved += size
+            self.by_host[host] += 1
+            self.by_rule[rule] += 1
+            self.recent.append((time.time(), url, rule))
+
+            page = self.pages.get(page_url)
+            if page is not None:
+                page.blocked += 1
+                page.bytes_saved += size
+
+    def flush(self):
+        """Append an aggregate of the blocks since the last flush to the stats file."""
+        # Only swaps happen under the lock; the counters are ranked outside it
+        with self.lock:
+            new_blocks = self.total - self._flushed_total
+            if not new_blocks:
+                return
+            hosts, self.by_host = self.by_host, Counter()
+            rules, self.by_rule = self.by_rule, Counter()
+            recent = list(self.recent) if self.verbose or self.sample_every else []
+            logged_total = self._logged_total
+            self._flushed_total = self._logged_total = self.total
+            total, bytes_saved = self.total, self.bytes_saved
+
+        to_log = self._blocks_to_log(recent, total - logged_total)
+        record = {
+            'time': time.time(),
+            'blocked': new_blocks,
+            'blocked_total': total,
+            'bytes_saved_total': bytes_saved,
+            'top_hosts': dict(hosts.most_common(TOP_ENTRIES)),
+            'top_rules': dict(rules.most_common(TOP_ENTRIES)),
+        }
+
+        for url, rule in to_log:
+            print(f"Blocked: {url} ({rule})")
+
+        if self.path:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(record) + '\n')
+            except OSError as e:
+                print(f"Could not write block stats: {e}")
+
+    def _blocks_to_log(self, recent, new_blocks):
+        """Pick the recent blocks the verbose or sampled log should show."""
+        if not self.verbose and not self.sample_every:
+            return []
+        entries = recent[-min(new_blocks, len(recent)):]
+        if not self.verbose:
+            entries = entries[::self.sample_every]
+        return [(url, rule) for _, url, rule in entries]
+
+
+def stats_from_environment():
+    """BlockStats configured from ``SBROWS_BLOCK_LOG`` (``1`` = every block, ``N`` = one in N)."""
+    setting = os.environ.get('SBROWS_BLOCK_LOG', '0')
+    every = int(setting) if setting.isdigit() else 0
+    return BlockStats(verbose=every == 1, sample_every=every if every > 1 else 0)
+
+
+class TabMetrics:
+    """Load timing of one tab, updated from its view's load signals."""
+
+    __slots__ = ('load_started', 'load_ms', 'loads', 'failed_loads')
+
+    def __init__(self):
+        self.load_started = None  # monotonic time of the navigation in progress
+        self.load_ms = None       # duration of the last finished load
+        self.loads = 0
+        self.failed_loads = 0
+
+    def navigation_started(self):
+        self.load_started = time.monotonic()
+
+    def load_finished(self, ok):
+        if self.load_started is None:
+            return
+        self.load_ms = (time.monotonic() - self.load_started) * 1000
+        self.load_started = None
+        self.loads += 1
+        if not ok:
+            self.failed_loads += 1
+
+    @property
+    def loading(self):
+        return self.load_started is not None
+
+
+class MetricsLog:
+    """Appends snapshots of per-tab metrics to a JSON-lines file."""
+
+    def __init__(self, path=METRICS_LOG_PATH):
+        self.path = path
+
+    def write(self, rows):
+        if not rows:
+            return
+        now = time.time()
+        try:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                for row in rows:
+                    file.write(json.dumps(dict(row, time=now)) + '\n')
+        except OSError as e:
+            print(f"Could not write tab metrics: {e}")
+
+
+def metrics_log_from_environment():
+    """MetricsLog for ``SBROWS_METRICS_LOG`` (``1`` = the default path, else a path), or None."""
+    setting = os.environ.get('SBROWS_METRICS_LOG', '')
+    if not setting or setting == '0':
+        return None
+    return MetricsLog(METRICS_LOG_PATH if setting == '1' else setting)
+
+
+class StartupTimeline:
+    """Named milestones of a start, in milliseconds since the process started."""
+
+    def __init__(self, started=None, path=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.path = path  # None keeps the marks in memory only
+        self.marks = []
+        self.finished = False
+
+    def mark(self, name):
+        """Note that ``name`` was reached; only the first time counts."""
+        if not self.finished and all(mark != name for mark, _ in self.marks):
+            self.marks.append((name, (time.perf_counter() - self.started) * 1000))
+
+    def finish(self):
+        """Stop recording and, if enabled, print the timeline and append it to the log."""
+        if self.finished:
+            return
+        self.finished = True
+        if not self.path:
+            return
+        for name, elapsed in self.marks:
+            print(f"Startup: {elapsed:8.1f} ms  {name}")
+        try:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'time': time.time(), 'marks': dict(self.marks)}) + '\n')
+        except OSError as e:
+            print(f"Could not write startup timeline: {e}")
+
+
+def startup_timeline_from_environment(started=None):
+    """StartupTimeline that reports when ``SBROWS_STARTUP_LOG`` is set (``1`` = the default path, else a path)."""
+    setting = os.environ.get('SBROWS_STARTUP_LOG', '')
+    path = None
+    if setting and setting != '0':
+        path = STARTUP_LOG_PATH if setting == '1' else setting
+    return StartupTimeline(started, path)
+
+
+def process_rss(pid):
+    """Resident memory of a process in bytes, or 0 if it can't be read."""
+    if not pid:
+        return 0
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return 0
+    try:
+        with open(f'/proc/{pid}/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
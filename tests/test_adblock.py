@@ -0,0 +1,166 @@
+"""Behaviour tests for the ad blocker's rule parsing and matching.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adblock import FilterEngine, parse_filter  # noqa: E402
+
+
+PAGE = 'https://news.example/article'
+
+
+class ParseFilterTest(unittest.TestCase):
+
+    def test_comments_and_cosmetic_rules_are_skipped(self):
+        for line in ['', '   ', '! comment', '[Adblock Plus 2.0]', 'example.com##.ad', 'example.com#@#.ad']:
+            self.assertIsNone(parse_filter(line), line)
+
+    def test_unsupported_option_drops_the_rule(self):
+        self.assertIsNone(parse_filter('||ads.example^$popup'))
+
+    def test_exception(self):
+        rule = parse_filter('@@||ads.example^')
+        self.assertTrue(rule.is_exception)
+        self.assertEqual(rule.domain, 'ads.example')
+
+    def test_options(self):
+        rule = parse_filter('/banner/*$script,image,~third-party,domain=a.example|~b.a.example')
+        self.assertEqual(rule.types, {'script', 'image'})
+        self.assertIs(rule.third_party, False)
+        self.assertEqual(rule.include_domains, {'a.example'})
+        self.assertEqual(rule.exclude_domains, {'b.a.example'})
+
+    def test_negated_type_excludes_document(self):
+        rule = parse_filter('/banner/$~script')
+        self.assertNotIn('script', rule.types)
+        self.assertNotIn('document', rule.types)
+        self.assertIn('image', rule.types)
+
+
+class FilterEngineTest(unittest.TestCase):
+
+    def engine(self, lines):
+        return FilterEngine(lines)
+
+    def assertBlocked(self, engine, url, source_url=PAGE, resource_type='other'):
+        self.assertIsNotNone(engine.match(url, source_url, resource_type), url)
+
+    def assertAllowed(self, engine, url, source_url=PAGE, resource_type='other'):
+        self.assertIsNone(engine.match(url, source_url, resource_type), url)
+
+    def test_domain_anchor(self):
+        engine = self.engine(['||ads.example^'])
+        self.assertBlocked(engine, 'https://ads.example/banner.png')
+        self.assertBlocked(engine, 'http://cdn.ads.example/x.js')
+        self.assertAllowed(engine, 'https://notads.example/banner.png')
+        self.assertAllowed(engine, 'https://ads.example.org/banner.png')
+
+    def test_start_and_end_anchors(self):
+        engine = self.engine(['|http://plain.example/', 'swf|'])
+        self.assertBlocked(engine, 'http://plain.example/page')
+        self.assertAllowed(engine, 'https://plain.example/page')
+        self.assertAllowed(engine, 'https://other.example/?u=http://plain.example/')
+        self.assertBlocked(engine, 'https://media.example/movie.swf')
+        self.assertAllowed(engine, 'https://media.example/movie.swf?autoplay=1')
+
+    def test_separator_and_wildcard(self):
+        engine = self.engine(['/banner/*/ad^'])
+        self.assertBlocked(engine, 'https://site.example/banner/300x250/ad?id=1')
+        self.assertBlocked(engine, 'https://site.example/banner/300x250/ad')
+        self.assertAllowed(engine, 'https://site.example/banner/300x250/admin')
+
+    def test_exception_overrides_block(self):
+        engine = self.engine(['||ads.example^', '@@||ads.example/allowed/'])
+        self.assertBlocked(engine, 'https://ads.example/banner.png')
+        self.assertAllowed(engine, 'https://ads.example/allowed/banner.png')
+
+    def test_exception_respects_its_options(self):
+        engine = self.engine(['||ads.example^', '@@||ads.example^$image'])
+        self.assertAllowed(engine, 'https://ads.example/a.png', resource_type='image')
+        self.assertBlocked(engine, 'https://ads.example/a.js', resource_type='script')
+
+    def test_third_party(self):
+        engine = self.engine(['||tracker.example^$third-party'])
+        self.assertBlocked(engine, 'https://tracker.example/p.gif')
+        self.assertAllowed(engine, 'https://tracker.example/p.gif', 'https://www.tracker.example/')
+        self.assertAllowed(engine, 'https://tracker.example/p.gif', '')
+
+    def test_first_party(self):
+        engine = self.engine(['/pixel.gif$~third-party'])
+        self.assertBlocked(engine, 'https://news.example/pixel.gif')
+        self.assertBlocked(engine, 'https://static.news.example/pixel.gif')
+        self.assertAllowed(engine, 'https://elsewhere.example/pixel.gif')
+
+    def test_third_party_uses_registrable_domain(self):
+        engine = self.engine(['||cdn.shop.co.uk^$third-party'])
+        self.assertAllowed(engine, 'https://cdn.shop.co.uk/a.js', 'https://www.shop.co.uk/')
+        self.assertBlocked(engine, 'https://cdn.shop.co.uk/a.js', 'https://www.other.co.uk/')
+
+    def test_resource_types(self):
+        engine = self.engine(['/ads/$script', '/promo/$~image'])
+        self.assertBlocked(engine, 'https://site.example/ads/a.js', resource_type='script')
+        self.assertAllowed(engine, 'https://site.example/ads/a.png', resource_type='image')
+        self.assertBlocked(engine, 'https://site.example/promo/a.js', resource_type='script')
+        self.assertAllowed(engine, 'https://site.example/promo/a.png', resource_type='image')
+
+    def test_untyped_rules_skip_documents(self):
+        engine = self.engine(['||ads.example^', '||popups.example^$document'])
+        self.assertAllowed(engine, 'https://ads.example/', resource_type='document')
+        self.assertBlocked(engine, 'https://ads.example/', resource_type='subdocument')
+        self.assertBlocked(engine, 'https://popups.example/', resource_type='document')
+
+    def test_domain_option(self):
+        engine = self.engine(['/sponsor.js$domain=news.example|~live.news.example'])
+        self.assertBlocked(engine, 'https://cdn.example/sponsor.js', 'https://www.news.example/')
+        self.assertAllowed(engine, 'https://cdn.example/sponsor.js', 'https://live.news.example/')
+        self.assertAllowed(engine, 'https://cdn.example/sponsor.js', 'https://blog.example/')
+
+    def test_match_case(self):
+        engine = self.engine(['/Banner.$match-case'])
+        self.assertBlocked(engine, 'https://site.example/Banner.png')
+        self.assertAllowed(engine, 'https://site.example/banner.png')
+
+    def test_regex_rule(self):
+        engine = self.engine([r'/\/ad[0-9]+\.js/'])
+        self.assertBlocked(engine, 'https://site.example/ad42.js')
+        self.assertAllowed(engine, 'https://site.example/add.js')
+
+    def test_document_exception_allowlists_page(self):
+        engine = self.engine(['||ads.example^', '@@||trusted.example^$document'])
+        self.assertTrue(engine.is_allowlisted('https://www.trusted.example/news'))
+        self.assertFalse(engine.is_allowlisted(PAGE))
+        self.assertAllowed(engine, 'https://ads.example/banner.png', 'https://www.trusted.example/news')
+        self.assertBlocked(engine, 'https://ads.example/banner.png', PAGE)
+
+    def test_plain_exception_does_not_allowlist_page(self):
+        engine = self.engine(['||ads.example^', '@@||trusted.example^'])
+        self.assertFalse(engine.is_allowlisted('https://trusted.example/'))
+        self.assertBlocked(engine, 'https://ads.example/banner.png', 'https://trusted.example/')
+
+    def test_len_counts_both_kinds(self):
+        engine = self.engine(['||a.example^', '/b/$script', '@@||c.example^', '! comment', 'x.example##.ad'])
+        self.assertEqual(len(engine), 3)
+
+
+class CompiledFilterEngineTest(FilterEngineTest):
+    """The same behaviour after a round trip through the memory-mapped format."""
+
+    def engine(self, lines):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'filters.compiled')
+        FilterEngine(lines).write_compiled(path, b'\0' * 32)
+        engine = FilterEngine.load_compiled(path)
+        self.assertIsNotNone(engine)
+        self.addCleanup(engine.blocking.buffer.close)
+        return engine
+
+
+if __name__ == '__main__':
+    unittest.main()
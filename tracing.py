@@ -0,0 +1,180 @@
+"""Trace-event spans for the browser's hot paths, and on-demand profiling.
+
+Methods decorated with ``@traced`` record a span (Chrome trace-event
+``"ph": "X"``) for every call while tracing is on; while it is off they
+cost one attribute check.  Tracing starts with ``SBROWS_TRACE=1`` or from
+the sidebar, and its spans are written to ``trace_python.json`` when it is
+stopped or the browser exits.
+
+With ``SBROWS_TRACE=1`` Chromium traces itself as well (through
+``QTWEBENGINE_CHROMIUM_FLAGS``) into ``trace_chromium.json``, written when
+the browser exits.  QtWebEngine runs Chromium's browser process inside ours
+and both clocks are ``CLOCK_MONOTONIC``, so the two files line up on one
+timeline once merged:
+
+    python tracing.py merge trace_chromium.json trace_python.json -o trace.json
+
+and the result opens in chrome://tracing or https://ui.perfetto.dev.
+
+``GuiProfiler`` runs cProfile over the GUI thread between two clicks and
+saves the stats for ``pstats`` / snakeviz.
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+
+# Both resolved once, at import, so the pair lands side by side whatever the working directory later is
+PYTHON_TRACE_PATH = os.path.abspath('trace_python.json')
+CHROMIUM_TRACE_PATH = os.path.abspath('trace_chromium.json')
+CHROMIUM_TRACE_CATEGORIES = 'toplevel,blink,cc,gpu,loading,net,navigation,renderer.scheduler,v8'
+MAX_EVENTS = 200000      # the oldest spans are dropped past this; each is a small tuple until written
+PROFILE_TOP_ENTRIES = 25
+
+
+def now_us():
+    """The trace clock in microseconds; the same clock as Chromium's trace timestamps on Linux."""
+    return time.monotonic_ns() // 1000
+
+
+class Tracer:
+    """Collects complete-duration spans while ``enabled``.
+
+    Spans are kept as ``(name, category, start, duration, thread)`` tuples and
+    only turned into trace-event dicts when they are written.
+    """
+
+    def __init__(self, path=PYTHON_TRACE_PATH, enabled=False):
+        self.path = path
+        self.enabled = enabled
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.pid = os.getpid()
+
+    def start(self):
+        self.enabled = True
+
+    def stop(self):
+        """Stop tracing and write out what was recorded; returns the file, or None."""
+        self.enabled = False
+        return self.write()
+
+    def add(self, name, category, started):
+        # deque appends are atomic, so any thread may record
+        self.events.append((name, category, started, now_us() - started, threading.get_native_id()))
+
+    def write(self, path=None):
+        path = path or self.path
+        if not self.events or not path:
+            return None
+        pid = self.pid
+        events = [{'name': name, 'cat': category, 'ph': 'X', 'ts': started, 'dur': duration, 'pid': pid, 'tid': tid}
+                  for name, category, started, duration, tid in list(self.events)]
+        self.events.clear()
+        temp_path = f'{path}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not write trace: {e}")
+            return None
+        print(f"Wrote {len(events)} trace events to {path}")
+        return path
+
+
+tracer = Tracer(enabled=os.environ.get('SBROWS_TRACE', '0') == '1')
+
+
+def traced(name=None, category='browser'):
+    """Decorator recording a span around every call while the shared tracer is on."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            started = now_us()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.add(span_name, category, started)
+        return wrapper
+    return decorate
+
+
+def chromium_trace_flags():
+    """Chromium switches that trace from startup to exit when ``SBROWS_TRACE=1``."""
+    if os.environ.get('SBROWS_TRACE', '0') != '1':
+        return []
+    categories = os.environ.get('SBROWS_TRACE_CATEGORIES', CHROMIUM_TRACE_CATEGORIES)
+    return [f'--trace-startup={categories}', f'--trace-startup-file={CHROMIUM_TRACE_PATH}',
+            '--trace-startup-duration=0']
+
+
+def read_trace_events(path):
+    """The events of a trace file in either the object or the bare-array form."""
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    return data.get('traceEvents', []) if isinstance(data, dict) else data
+
+
+def merge_traces(paths, output):
+    events = []
+    for path in paths:
+        events.extend(read_trace_events(path))
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+    return len(events)
+
+
+class GuiProfiler:
+    """cProfile of the thread that starts it, saved to a ``.prof`` file when stopped."""
+
+    def __init__(self):
+        self.profile = None
+
+    @property
+    def running(self):
+        return self.profile is not None
+
+    def start(self):
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self, path=None):
+        """Stop profiling, save the stats and print the top entries; returns the file."""
+        if self.profile is None:
+            return None
+        profile, self.profile = self.profile, None
+        profile.disable()
+        path = path or time.strftime('gui_profile_%Y%m%d_%H%M%S.prof')
+        try:
+            profile.dump_stats(path)
+        except OSError as e:
+            print(f"Could not write profile: {e}")
+            path = None
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(PROFILE_TOP_ENTRIES)
+        print(report.getvalue())
+        return path
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Merge Chrome trace-event files into one timeline.')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    merge = subcommands.add_parser('merge')
+    merge.add_argument('paths', nargs='+')
+    merge.add_argument('-o', '--output', default='trace.json')
+    args = parser.parse_args()
+    count = merge_traces(args.paths, args.output)
+    print(f"Merged {count} events into {args.output}")